@@ -1,19 +1,42 @@
+import importlib
 from flask import Flask
 from flask_cors import CORS
-import app.app as routes_module # Import the app.py module specifically
+from app.json_provider import FastJSONProvider
 
-# Create the main Flask application instance
-app = Flask(__name__)
+# The main Flask application is created on first access of `app.app` (as
+# `gunicorn app:app` and `flask --app app run` do), not when the package is
+# imported: importing app.app builds the rollups, configures GC and starts the
+# in-process ingestion scheduler, which scripts such as ingest_worker.py and
+# migrate.py only importing app.<module> must not trigger.
 
-# CORS is configured in app.py with specific origins
-# CORS(app)  # Removed to avoid conflicts
+def create_app():
+    """Create the main Flask application and register the API Blueprint."""
+    # Import the app.py module specifically (once imported, the package's
+    # `app` attribute is the application, so `import app.app` can't be used)
+    routes_module = importlib.import_module('app.app')
 
-# Register the Blueprint from the imported module
-# Access api_bp as an attribute of routes_module
-app.register_blueprint(routes_module.api_bp)
+    flask_app = Flask(__name__)
+    flask_app.json = FastJSONProvider(flask_app)
+
+    # CORS is configured in app.py with specific origins
+    # CORS(flask_app)  # Removed to avoid conflicts
+
+    # Register the Blueprint from the imported module
+    # Access api_bp as an attribute of routes_module
+    flask_app.register_blueprint(routes_module.api_bp)
+    return flask_app
+
+def __getattr__(name):
+    if name == 'app':
+        # Importing the app.app submodule binds it to this name; replace it
+        # with the application
+        flask_app = create_app()
+        globals()['app'] = flask_app
+        return flask_app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # The if __name__ == '__main__': block is generally not needed here
 # when using the 'flask run' command with FLASK_APP, as 'flask run'
 # handles running the app. It's more for direct execution like 'python -m app'.
 # if __name__ == '__main__':
-#     app.run(debug=True) 
\ No newline at end of file
+#     app.run(debug=True)
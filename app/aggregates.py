@@ -0,0 +1,75 @@
+from collections import namedtuple
+from sqlalchemy import String, case, func, literal, select, union_all
+from sqlalchemy.orm import aliased
+from app.models import DailyReport
+
+# SQL-side aggregation over a pharmacy's DailyReport range. Expressions built
+# here are evaluated by the database so range endpoints fetch one row of
+# scalars instead of hydrating every report in the range.
+
+RangeScope = namedtuple('RangeScope', ['pharmacy', 'start_date', 'end_date'])
+
+def range_filters(scope, model=DailyReport):
+    """Filters for the scope. A start_date or end_date of None leaves that side open."""
+    filters = [model.pharmacy_code == scope.pharmacy]
+    if scope.start_date is not None:
+        filters.append(model.report_date >= scope.start_date)
+    if scope.end_date is not None:
+        filters.append(model.report_date <= scope.end_date)
+    return tuple(filters)
+
+def pharmacy_list(pharmacies, name='pharmacies'):
+    """Subquery with one row per pharmacy code (column pharmacy_code), to join or group against."""
+    codes = dict.fromkeys(pharmacies)  # de-duplicated, order kept
+    return union_all(*[select(literal(code, String).label('pharmacy_code')) for code in codes]).subquery(name)
+
+def _only_where(column, condition):
+    return column if condition is None else case((condition, column))
+
+def total(column, condition=None):
+    """SUM of column, optionally only over rows matching condition. 0 when empty."""
+    return func.coalesce(func.sum(_only_where(column, condition)), 0)
+
+def average(column, condition=None):
+    """AVG of column, optionally only over rows matching condition. NULL when empty."""
+    return func.avg(_only_where(column, condition))
+
+def count(condition=None):
+    """Number of rows, optionally only those matching condition."""
+    if condition is None:
+        return func.count(DailyReport.id)
+    return func.count(case((condition, 1)))
+
+def _edge_value(scope, attr, value_attr, positive, newest):
+    report = aliased(DailyReport)
+    column = getattr(report, attr)
+    conditions = list(range_filters(scope, report)) + [column.isnot(None)]
+    if positive:
+        conditions.append(column > 0)
+    order = report.report_date.desc() if newest else report.report_date.asc()
+    return (
+        select(getattr(report, value_attr or attr))
+        .where(*conditions)
+        .order_by(order)
+        .limit(1)
+        .correlate(None)
+        .scalar_subquery()
+    )
+
+def first_value(scope, attr, value_attr=None, positive=False):
+    """Scalar subquery: value_attr (default attr) on the earliest day where attr is set."""
+    return _edge_value(scope, attr, value_attr, positive, newest=False)
+
+def last_value(scope, attr, value_attr=None, positive=False):
+    """Scalar subquery: value_attr (default attr) on the latest day where attr is set."""
+    return _edge_value(scope, attr, value_attr, positive, newest=True)
+
+def aggregate_range(session, scope, expressions):
+    """Evaluate {label: expression} over the range in one statement and return {label: scalar}."""
+    labels = list(expressions)
+    # The row count keeps the statement aggregated even if only subqueries were requested
+    row = session.query(
+        count().label('_report_count'),
+        *[expressions[label].label(label) for label in labels]
+    ).filter(*range_filters(scope)).one()
+    return {label: row[i + 1] for i, label in enumerate(labels)}
@@ -0,0 +1,159 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import Response, g, make_response, request
+from app.db import request_session
+from app.data_version import get_data_version
+from config.settings import RESPONSE_CACHE_ENABLED, RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL
+
+class ResponseCache:
+    """Thread-safe LRU cache of response bodies with a TTL and version check.
+
+    Each entry remembers the pharmacy data version it was computed from; a
+    lookup with a newer version is treated as a miss and the entry replaced.
+    """
+
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            entry_version, stored_at, value = entry
+            if entry_version != version or time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self.invalidations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, version, value):
+        with self._lock:
+            self._entries[key] = (version, time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": RESPONSE_CACHE_ENABLED,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None
+            }
+
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
+
+def request_pharmacy(kwargs):
+    """The pharmacy a range request is about: path argument, X-Pharmacy header or query string."""
+    return kwargs.get('pharmacy_code') or request.headers.get('X-Pharmacy') or request.args.get('pharmacy')
+
+def current_data_version(pharmacy):
+    """The pharmacy's data version, read once per request and kept on flask.g."""
+    if getattr(g, 'data_version', None) is None or g.data_version[0] != pharmacy:
+        g.data_version = (pharmacy, get_data_version(request_session(), pharmacy)[0])
+    return g.data_version[1]
+
+# Changes with every deploy on Render so new code never matches old ETags
+ETAG_SALT = os.environ.get('RENDER_GIT_COMMIT', '')
+
+def request_etag(pharmacy, version, kwargs):
+    """Strong ETag over the pharmacy's data version and the request parameters."""
+    parts = [
+        ETAG_SALT,
+        request.endpoint or '',
+        pharmacy or '',
+        str(version),
+        repr(sorted(kwargs.items())),
+        repr(sorted(request.args.items(multi=True)))
+    ]
+    return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+
+def conditional_get(f):
+    """Answer If-None-Match with 304 when the pharmacy's data has not changed.
+
+    Successful responses carry an ETag and 'Cache-Control: private, no-cache',
+    so browsers keep them and revalidate on every use instead of refetching.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        pharmacy = request_pharmacy(kwargs)
+        try:
+            etag = request_etag(pharmacy, current_data_version(pharmacy), kwargs)
+        except Exception as e:
+            print(f"[ETag] Could not read data version for {pharmacy}, skipping ETag: {e}", flush=True)
+            return f(*args, **kwargs)
+
+        # Weak comparison: compressed responses carry the ETag in weak form
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            response = make_response(f(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    return decorated_function
+
+def cached_response(f):
+    """Serve repeat GETs from the in-process cache while the pharmacy's data version is unchanged.
+
+    Keyed by (endpoint, pharmacy, path arguments, query string). Only 200
+    responses with a body in hand are stored; streamed responses (the daily
+    series) pass through uncached so they keep streaming.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not RESPONSE_CACHE_ENABLED:
+            return f(*args, **kwargs)
+        pharmacy = request_pharmacy(kwargs)
+        key = (
+            request.endpoint,
+            pharmacy,
+            tuple(sorted(kwargs.items())),
+            tuple(sorted(request.args.items(multi=True)))
+        )
+        try:
+            version = current_data_version(pharmacy)
+        except Exception as e:
+            print(f"[Cache] Could not read data version for {pharmacy}, bypassing cache: {e}", flush=True)
+            return f(*args, **kwargs)
+
+        cached = response_cache.get(key, version)
+        if cached is not None:
+            body, mimetype = cached
+            return Response(body, status=200, mimetype=mimetype)
+
+        response = make_response(f(*args, **kwargs))
+        if response.status_code == 200 and not response.is_streamed:
+            response_cache.put(key, version, (response.get_data(), response.mimetype))
+        return response
+    return decorated_function
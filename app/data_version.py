@@ -0,0 +1,23 @@
+from datetime import datetime
+from app.models import DataVersion
+from app.upsert import upsert
+
+# Per-pharmacy data versions. Every code path that writes DailyReport rows
+# bumps the pharmacy's version; readers use it to tell whether anything they
+# derived from those rows (cached responses, ETags) is still current.
+
+def get_data_version(session, pharmacy):
+    """Current (version, updated_at) for a pharmacy, (0, None) if never written."""
+    row = session.query(DataVersion.version, DataVersion.updated_at).filter(
+        DataVersion.pharmacy_code == pharmacy
+    ).first()
+    return (row.version, row.updated_at) if row else (0, None)
+
+def bump_data_version(session, pharmacy):
+    """Increment and commit a pharmacy's data version."""
+    now = datetime.utcnow()
+    upsert(session, DataVersion,
+           {'pharmacy_code': pharmacy, 'version': 1, 'updated_at': now},
+           ['pharmacy_code'],
+           {'version': DataVersion.version + 1, 'updated_at': now})
+    session.commit()
@@ -1,50 +1,88 @@
 import os
 os.makedirs('db', exist_ok=True)
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, scoped_session
+from flask import g, request
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 from app.models import Base
-from config.settings import DATABASE_URI # Import DATABASE_URI
+from app.migrations import run_migrations
+from app.pool_telemetry import InstrumentedQueuePool
+from config.settings import DATABASE_URI, DATABASE_READ_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_AUTO_MIGRATE
 
-# Create engine with better memory management
-if DATABASE_URI.startswith('sqlite'):
-    # For SQLite, use more conservative settings
-    engine = create_engine(
-        DATABASE_URI, 
+def _create_engine(uri):
+    """Engine with better memory management for the given database URI."""
+    if uri.startswith('sqlite'):
+        # For SQLite, use more conservative settings
+        return create_engine(
+            uri, 
+            echo=False,
+            poolclass=StaticPool,
+            pool_pre_ping=True,
+            connect_args={
+                'check_same_thread': False,
+                'timeout': 20
+            }
+        )
+    # For PostgreSQL and other databases. Pool limits come from settings;
+    # the instrumented pool reports checkout waits on /api/status.
+    return create_engine(
+        uri,
         echo=False,
-        poolclass=StaticPool,
+        poolclass=InstrumentedQueuePool,
         pool_pre_ping=True,
-        connect_args={
-            'check_same_thread': False,
-            'timeout': 20
-        }
-    )
-else:
-    # For PostgreSQL and other databases
-    engine = create_engine(
-        DATABASE_URI,
-        echo=False,
-        pool_pre_ping=True,
-        pool_recycle=300,  # Recycle connections every 5 minutes
-        pool_timeout=20,
-        max_overflow=0,  # Don't allow overflow connections
-        pool_size=2      # Keep pool small for memory efficiency
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_timeout=DB_POOL_TIMEOUT,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_size=DB_POOL_SIZE
     )
 
-# Use scoped session for thread safety and better cleanup
-SessionLocal = scoped_session(sessionmaker(autocommit=False, autoflush=False, bind=engine))
+# Primary database: all writes, ingestion and scripts
+engine = _create_engine(DATABASE_URI)
 
-def create_session():
-    """Create a new database session with automatic cleanup."""
-    return SessionLocal()
+# Optional read replica for GET requests; without one, reads use the primary
+read_engine = _create_engine(DATABASE_READ_URL) if DATABASE_READ_URL else engine
+
+# Create any tables added since the database was provisioned (e.g. monthly_rollups).
+# Existing tables are left untouched.
+Base.metadata.create_all(engine)
 
-def cleanup_db_sessions():
-    """Clean up database sessions to free memory."""
+# Then bring existing tables up to date (indexes etc., see app/migrations.py)
+if DB_AUTO_MIGRATE:
     try:
-        SessionLocal.remove()
-        print("[DB] Database sessions cleaned up", flush=True)
+        run_migrations(engine)
     except Exception as e:
-        print(f"[DB] Error cleaning up sessions: {e}", flush=True)
+        print(f"[Migrations] Could not apply schema migrations: {e}", flush=True)
+
+# Web requests use request_session(): one session per request, opened on
+# first use and closed in teardown_appcontext. Scripts and background jobs
+# call create_session() and close it themselves.
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# GET/HEAD requests only read, so their sessions go to the read engine, skip
+# expire-on-commit and refuse to flush
+ReadOnlySession = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=read_engine)
+
+@event.listens_for(ReadOnlySession, 'before_flush')
+def _reject_flush(session, flush_context, instances):
+    raise RuntimeError("Attempted to write through a read-only (GET request) session")
+
+def create_session():
+    """Create a new database session. The caller is responsible for closing it."""
+    return SessionLocal()
+
+def request_session():
+    """The current request's session, created on first use (read-only for GET/HEAD)."""
+    session = g.get('db_session')
+    if session is None:
+        factory = ReadOnlySession if request.method in ('GET', 'HEAD') else SessionLocal
+        session = g.db_session = factory()
+    return session
+
+def close_request_session(exception=None):
+    """teardown_appcontext handler: close the request's session, returning its connection."""
+    session = g.pop('db_session', None)
+    if session is not None:
+        session.close()
 
 # Add this function for compatibility with scripts
 
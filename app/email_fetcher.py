@@ -1,36 +1,35 @@
 import imaplib
 import email
 from email.header import decode_header
-import os
 import datetime
-import tempfile
 import socket
-from config.settings import GMAIL_USER, GMAIL_PASSWORD, IMAP_SERVER
+from config.settings import GMAIL_USER, GMAIL_PASSWORD, IMAP_SERVER, IMAP_PORT, IMAP_SSL, IMAP_TIMEOUT, IMAP_PARTIAL_FETCH
+from app.imap_structure import parse_fetch_response, find_report_part, decode_part, envelope_fields
 
-# Use a more reliable temp directory that works on all platforms
-TEMP_DIR = os.path.join(tempfile.gettempdir(), "daily_html")
+# Messages whose ENVELOPE and BODYSTRUCTURE are requested per UID FETCH in partial mode
+METADATA_BATCH_SIZE = 100
 
-if not os.path.exists(TEMP_DIR):
-    try:
-        os.makedirs(TEMP_DIR, exist_ok=True)
-    except OSError as e:
-        print(f"Warning: Could not create temp directory {TEMP_DIR}: {e}")
-        # Fallback to system temp directory
-        TEMP_DIR = tempfile.gettempdir()
+# Reports are yielded as the raw bytes of the .htm attachment or HTML body
+# (windows-1252, see app.parser.parse_html_daily) and never touch the disk.
 
 def _get_imap_connection(pharmacy_config):
     """Get IMAP connection with proper timeout and error handling."""
     user = pharmacy_config.get("email_user", GMAIL_USER)
     password = pharmacy_config.get("email_password", GMAIL_PASSWORD)
     server = pharmacy_config.get("imap_server", IMAP_SERVER)
+    port = pharmacy_config.get("imap_port", IMAP_PORT)
+    use_ssl = pharmacy_config.get("imap_ssl", IMAP_SSL)
     
     if not user or not password:
         raise ValueError(f"Missing email credentials for pharmacy {pharmacy_config.get('code', 'unknown')}")
     
     try:
-        # Set socket timeout to prevent hanging connections
-        socket.setdefaulttimeout(30)
-        mail = imaplib.IMAP4_SSL(server)
+        # Per-connection timeout to prevent hanging connections; a process-wide
+        # socket.setdefaulttimeout() would also apply to the app's DB sockets
+        if use_ssl:
+            mail = imaplib.IMAP4_SSL(server, port, timeout=IMAP_TIMEOUT)
+        else:
+            mail = imaplib.IMAP4(server, port, timeout=IMAP_TIMEOUT)
         mail.login(user, password)
         return mail
     except imaplib.IMAP4.error as e:
@@ -40,57 +39,118 @@ def _get_imap_connection(pharmacy_config):
     except Exception as e:
         raise Exception(f"Failed to connect to IMAP server {server}: {e}")
 
-def _save_report_content(msg, pharmacy_code, email_date_from_header):
-    """Saves HTML part or .htm attachment to a temporary file. Returns filepath or None."""
-    if isinstance(email_date_from_header, datetime.datetime):
-        report_file_date_obj = email_date_from_header.date()
-    elif isinstance(email_date_from_header, datetime.date):
-        report_file_date_obj = email_date_from_header
-    else:
-        try:
-            report_file_date_obj = datetime.datetime.strptime(str(email_date_from_header), '%Y-%m-%d').date()
-        except ValueError:
-            print(f"Warning: Could not parse email_date '{email_date_from_header}' for filename. Using email header date or today.")
-            try:
-                date_tuple = email.utils.parsedate_tz(msg['Date'])
-                if date_tuple:
-                    local_date = datetime.datetime.fromtimestamp(email.utils.mktime_tz(date_tuple))
-                    report_file_date_obj = local_date.date()
-                else:
-                    report_file_date_obj = datetime.date.today()
-            except Exception:
-                report_file_date_obj = datetime.date.today()
-
-    saved_body_path = None
+def _report_content(msg):
+    """Raw bytes of the .htm attachment, else of the first inline HTML part, or None."""
+    body = None
     for part in msg.walk():
         content_type = part.get_content_type()
         content_disposition = str(part.get("Content-Disposition"))
         part_filename = part.get_filename()
 
         if part_filename and part_filename.lower().endswith(".htm") and "attachment" in content_disposition:
+            return part.get_payload(decode=True)
+
+        if content_type == "text/html" and "attachment" not in content_disposition and body is None:
+            body = part.get_payload(decode=True)
+
+    return body
+
+def _decode_subject(subject_header):
+    """Decode a possibly RFC 2047 encoded Subject header to text."""
+    # The subject might be split into parts
+    subject_parts = []
+    for part, encoding in decode_header(subject_header):
+        if isinstance(part, bytes):
+            subject_parts.append(part.decode(encoding or 'utf-8', 'ignore'))
+        else:
+            subject_parts.append(part)
+    return "".join(subject_parts)
+
+def _subject_and_date(subject_header, email_date_str_header):
+    """(decoded subject, report_date_obj) from raw Subject and Date headers."""
+    subject = "No Subject"
+    try:
+        subject = _decode_subject(subject_header)
+    except Exception as e:
+        print(f"Could not decode subject for email on {email_date_str_header}: {e}")
+
+    try:
+        email_dt_header = email.utils.parsedate_to_datetime(email_date_str_header)
+        report_date_obj = email_dt_header.date() # This is the date from email header
+    except Exception as e:
+        print(f"Could not parse date from email header: '{email_date_str_header}'. Error: {e}. Using today's date.")
+        report_date_obj = datetime.date.today()
+    return subject, report_date_obj
+
+def _report_from_message(msg):
+    """A message's report. Returns (report bytes or None, report_date_obj, subject)."""
+    subject, report_date_obj = _subject_and_date(msg["Subject"], msg["Date"])
+    return _report_content(msg), report_date_obj, subject
+
+def _fetch_whole_message(mail, uid):
+    """Download a message with RFC822. Returns (report bytes or None, report_date_obj, subject, uid)."""
+    status, msg_data = mail.uid('fetch', str(uid), "(RFC822)")
+    if status != "OK":
+        raise Exception(f"Failed to fetch UID {uid}: {status}")
+    raw = next((part[1] for part in msg_data if isinstance(part, tuple)), None)
+    if raw is None:
+        return None, None, "", uid
+    report, report_date_obj, subject = _report_from_message(email.message_from_bytes(raw))
+    return report, report_date_obj, subject, uid
+
+def _fetch_report_parts(mail, uids):
+    """Yield (report bytes or None, report_date_obj, subject, uid) per UID, downloading only report parts.
+
+    ENVELOPE and BODYSTRUCTURE are fetched in batches first; forwarded emails
+    and emails without an HTML part are yielded without downloading any body,
+    otherwise only the report's section is fetched with BODY.PEEK (which also
+    leaves the message unread).
+    """
+    for start in range(0, len(uids), METADATA_BATCH_SIZE):
+        batch = uids[start:start + METADATA_BATCH_SIZE]
+        status, data = mail.uid('fetch', ",".join(str(uid) for uid in batch), "(UID ENVELOPE BODYSTRUCTURE)")
+        if status != "OK":
+            raise Exception(f"Failed to fetch message structure: {status}")
+        metadata = parse_fetch_response(data)
+
+        for uid in batch:
+            items = metadata.get(uid, {})
+            if not isinstance(items.get('ENVELOPE'), list) or not isinstance(items.get('BODYSTRUCTURE'), list):
+                # Server gave us nothing usable for this message
+                yield _fetch_whole_message(mail, uid)
+                continue
+
+            date_header, subject_header = envelope_fields(items['ENVELOPE'])
+            subject, report_date_obj = _subject_and_date(subject_header, date_header)
+            # Forwarded emails don't contain the report
+            if "fwd:" in subject.lower():
+                yield None, report_date_obj, subject, uid
+                continue
+
+            section, part = find_report_part(items['BODYSTRUCTURE'])
+            if section is None:
+                yield None, report_date_obj, subject, uid
+                continue
+
+            status, data = mail.uid('fetch', str(uid), f"(BODY.PEEK[{section}])")
+            if status != "OK":
+                raise Exception(f"Failed to fetch section {section} of UID {uid}: {status}")
+            payload = parse_fetch_response(data).get(uid, {}).get(f"BODY[{section}]")
+            report = None
             try:
-                clean_attachment_name = f"{pharmacy_code}_{report_file_date_obj.strftime('%Y%m%d')}_{os.path.basename(part_filename)}"
-                filepath_attachment = os.path.join(TEMP_DIR, clean_attachment_name)
-                with open(filepath_attachment, "wb") as f:
-                    f.write(part.get_payload(decode=True))
-                return filepath_attachment
-            except Exception as e:
-                print(f"Error saving attachment {part_filename} for {report_file_date_obj}: {e}")
-        
-        if content_type == "text/html" and "attachment" not in content_disposition and not saved_body_path:
-            try:
-                body = part.get_payload(decode=True).decode(errors='replace')
-                filename_body = os.path.join(TEMP_DIR, f"{pharmacy_code}_{report_file_date_obj.strftime('%Y%m%d')}_body.htm")
-                with open(filename_body, "w", encoding="utf-8") as f:
-                    f.write(body)
-                saved_body_path = filename_body
+                if isinstance(payload, str):
+                    payload = payload.encode('utf-8')
+                report = decode_part(payload or b"", part['encoding'])
             except Exception as e:
-                print(f"Error decoding/saving HTML body for {report_file_date_obj}: {e}")
-    
-    return saved_body_path
+                print(f"Error decoding report part {section} for {report_date_obj}: {e}")
+            yield report, report_date_obj, subject, uid
 
-def fetch_emails_last_n_days(pharmacy_config, days=7):
-    """Fetches emails from the last N days and yields (filepath, report_date_obj, subject)."""
+def fetch_emails_last_n_days(pharmacy_config, days=7, partial=IMAP_PARTIAL_FETCH):
+    """Fetches emails from the last N days and yields (report bytes, report_date_obj, subject).
+
+    With partial, only each email's report part is downloaded and forwarded
+    emails are skipped before any body is fetched.
+    """
     mail = None
     try:
         pharmacy_name = pharmacy_config.get('name', pharmacy_config.get('code', 'unknown'))
@@ -105,7 +165,10 @@ def fetch_emails_last_n_days(pharmacy_config, days=7):
         search_criteria = '(SINCE "' + search_criteria_date_str + '")'
         
         print(f"Searching for emails since {search_criteria_date_str} for {pharmacy_name}...")
-        status, messages = mail.search(None, search_criteria)
+        if partial:
+            status, messages = mail.uid('search', None, search_criteria)
+        else:
+            status, messages = mail.search(None, search_criteria)
         if status != "OK":
             print(f"IMAP search failed for {pharmacy_name}: {status}")
             return
@@ -116,6 +179,14 @@ def fetch_emails_last_n_days(pharmacy_config, days=7):
 
         email_ids = messages[0].split()
         print(f"Found {len(email_ids)} email(s) since {search_criteria_date_str} for {pharmacy_name}")
+
+        if partial:
+            # Newest first within the date range, as below
+            uids = sorted((int(uid) for uid in email_ids), reverse=True)
+            for report, report_date_obj, subject, uid in _fetch_report_parts(mail, uids):
+                if report:
+                    yield report, report_date_obj, subject
+            return
         
         for i, email_id in enumerate(reversed(email_ids)): # Process newest first within the date range
             try:
@@ -128,36 +199,11 @@ def fetch_emails_last_n_days(pharmacy_config, days=7):
                 for response_part in msg_data:
                     if isinstance(response_part, tuple):
                         try:
-                            msg = email.message_from_bytes(response_part[1])
-                            email_date_str_header = msg["Date"]
-                            subject_header = msg["Subject"]
-                            report_date_obj = None
-                            
-                            # Decode subject
-                            subject = "No Subject"
-                            try:
-                                decoded_subject = decode_header(subject_header)
-                                # The subject might be split into parts
-                                subject_parts = []
-                                for part, encoding in decoded_subject:
-                                    if isinstance(part, bytes):
-                                        subject_parts.append(part.decode(encoding or 'utf-8', 'ignore'))
-                                    else:
-                                        subject_parts.append(part)
-                                subject = "".join(subject_parts)
-                            except Exception as e:
-                                print(f"Could not decode subject for email on {email_date_str_header}: {e}")
-
-                            try:
-                                email_dt_header = email.utils.parsedate_to_datetime(email_date_str_header)
-                                report_date_obj = email_dt_header.date() # This is the date from email header
-                            except Exception as e:
-                                print(f"Could not parse date from email header: '{email_date_str_header}'. Error: {e}. Using today's date.")
-                                report_date_obj = datetime.date.today() 
-                            
-                            filepath = _save_report_content(msg, pharmacy_config['code'], report_date_obj)
-                            if filepath:
-                                yield filepath, report_date_obj, subject
+                            report, report_date_obj, subject = _report_from_message(
+                                email.message_from_bytes(response_part[1])
+                            )
+                            if report:
+                                yield report, report_date_obj, subject
                         except Exception as e:
                             print(f"Error processing email content for {pharmacy_name}: {e}")
                             continue
@@ -184,4 +230,65 @@ def sync_all_emails(pharmacy_config):
         yield from fetch_emails_last_n_days(pharmacy_config, days=3650) 
     except Exception as e:
         print(f"Error during sync_all_emails for {pharmacy_name}: {e}")
-        raise e 
\ No newline at end of file
+        raise e
+
+def _search_since(days):
+    # IMAP date format: DD-Mon-YYYY (e.g., 01-Jan-2023)
+    date_since = (datetime.date.today() - datetime.timedelta(days=days-1))
+    return '(SINCE "' + date_since.strftime("%d-%b-%Y") + '")'
+
+def fetch_new_emails(pharmacy_config, watermark, days=7, partial=IMAP_PARTIAL_FETCH, mail=None):
+    """Fetch only the messages after a mailbox's UID watermark, oldest first.
+
+    Unlike fetch_emails_last_n_days (newest first), messages come in UID
+    order so the watermark only ever moves forward past handled messages.
+
+    watermark is a dict with 'uidvalidity' and 'last_uid' (both None on the
+    first sync). If it is missing or the server's UIDVALIDITY has changed,
+    the last `days` days are searched instead and the watermark is reset.
+    Yields (report bytes or None, report_date_obj, subject, uid) for every new
+    message, including ones without a report, so callers can advance the
+    watermark past them; watermark['uidvalidity'] is set before the first yield.
+    With partial, only each message's report part is downloaded. An already
+    authenticated connection can be passed as mail; it is left open.
+    """
+    owned = mail is None
+    pharmacy_name = pharmacy_config.get('name', pharmacy_config.get('code', 'unknown'))
+    try:
+        if owned:
+            mail = _get_imap_connection(pharmacy_config)
+        status, _ = mail.select("inbox")
+        if status != "OK":
+            raise Exception(f"Could not select inbox: {status}")
+        uidvalidity = int(mail.response('UIDVALIDITY')[1][0])
+
+        last_uid = watermark.get('last_uid') or 0
+        if watermark.get('uidvalidity') == uidvalidity and last_uid:
+            criteria = f"UID {last_uid + 1}:*"
+        else:
+            if watermark.get('uidvalidity') is not None:
+                print(f"UIDVALIDITY changed for {pharmacy_name} ({watermark.get('uidvalidity')} -> {uidvalidity}), resyncing the last {days} days")
+            criteria = _search_since(days)
+            last_uid = 0
+        watermark['uidvalidity'] = uidvalidity
+        watermark['last_uid'] = last_uid
+
+        status, data = mail.uid('search', None, criteria)
+        if status != "OK":
+            raise Exception(f"IMAP UID search failed: {status}")
+        # "n:*" always matches the newest message, even when its UID is below n
+        uids = sorted(uid for uid in (int(u) for u in data[0].split()) if uid > last_uid)
+        print(f"Found {len(uids)} new email(s) for {pharmacy_name} after UID {last_uid}")
+
+        if partial:
+            yield from _fetch_report_parts(mail, uids)
+        else:
+            for uid in uids:
+                yield _fetch_whole_message(mail, uid)
+    finally:
+        if owned and mail:
+            try:
+                mail.close()
+                mail.logout()
+            except Exception as e_logout:
+                print(f"Error during IMAP logout: {e_logout}")
@@ -0,0 +1,64 @@
+from sqlalchemy import Date, String, and_, cast, exists, func, literal, select, text, true
+from app.models import DailyReport
+from app.aggregates import pharmacy_list
+
+# Calendar gap queries: days in a range with no report carrying positive
+# turnover. The calendar is generated by the database (generate_series on
+# PostgreSQL, a recursive CTE elsewhere) and anti-joined against the reports,
+# so only the missing days ever leave the database.
+
+def _iso(value):
+    # PostgreSQL returns date objects, SQLite the stored ISO strings
+    return value.strftime('%Y-%m-%d') if hasattr(value, 'strftime') else value
+
+def calendar_days(session, start_date, end_date):
+    """A selectable with one row per day from start_date to end_date inclusive, column 'day'."""
+    if session.get_bind().dialect.name == 'postgresql':
+        series = func.generate_series(
+            cast(literal(start_date), Date),
+            cast(literal(end_date), Date),
+            text("interval '1 day'")
+        )
+        return select(cast(series, Date).label('day')).subquery('days')
+
+    # Dates are stored as ISO text on SQLite, so the CTE walks ISO strings
+    days = select(literal(start_date.isoformat(), String).label('day')).cte('days', recursive=True)
+    return days.union_all(
+        select(func.date(days.c.day, '+1 day')).where(days.c.day < end_date.isoformat())
+    )
+
+def _has_turnover(pharmacy_code, day):
+    return exists().where(and_(
+        DailyReport.pharmacy_code == pharmacy_code,
+        DailyReport.report_date == day,
+        DailyReport.total_turnover_today > 0
+    ))
+
+def missing_turnover_dates(session, pharmacy, start_date, end_date):
+    """ISO dates between start_date and end_date (date objects) without positive turnover."""
+    if start_date > end_date:
+        return []
+    days = calendar_days(session, start_date, end_date)
+    rows = session.execute(
+        select(days.c.day)
+        .where(~_has_turnover(pharmacy, days.c.day))
+        .order_by(days.c.day)
+    )
+    return [_iso(row.day) for row in rows]
+
+def missing_turnover_dates_by_pharmacy(session, pharmacies, start_date, end_date):
+    """{pharmacy: [ISO dates without positive turnover]} for several pharmacies in one statement."""
+    missing = {pharmacy: [] for pharmacy in pharmacies}
+    if not pharmacies or start_date > end_date:
+        return missing
+    days = calendar_days(session, start_date, end_date)
+    codes = pharmacy_list(pharmacies)
+    rows = session.execute(
+        select(codes.c.pharmacy_code, days.c.day)
+        .select_from(codes.join(days, true()))  # every pharmacy x every day
+        .where(~_has_turnover(codes.c.pharmacy_code, days.c.day))
+        .order_by(codes.c.pharmacy_code, days.c.day)
+    )
+    for row in rows:
+        missing[row.pharmacy_code].append(_iso(row.day))
+    return missing
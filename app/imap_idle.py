@@ -0,0 +1,162 @@
+import imaplib
+import re
+import socket
+import threading
+import time
+from datetime import datetime
+from app.email_fetcher import _get_imap_connection
+from config.settings import IMAP_TIMEOUT
+
+# IMAP IDLE (RFC 2177) push notifications. A MailboxWatcher keeps one
+# authenticated connection per mailbox open on a daemon thread, waits in IDLE
+# until the server reports new messages, then hands the same connection to a
+# callback to fetch them, so new reports are ingested within seconds without
+# polling or a fresh login. Lost connections are reopened with exponential
+# backoff. imaplib has no IDLE support before Python 3.14, so the command is
+# spoken directly over the connection's socket.
+
+_CHANGED = re.compile(rb'^\* \d+ (EXISTS|RECENT)\b', re.IGNORECASE)
+
+def idle_wait(mail, timeout):
+    """Wait in IDLE for up to timeout seconds. Returns True if the server reported new messages.
+
+    A mailbox must be selected. The connection is usable for normal
+    commands again when this returns.
+    """
+    tag = b'IDLE' + str(int(time.monotonic() * 1000) % 100000).encode('ascii')
+    mail.send(tag + b' IDLE\r\n')
+    line = mail.readline()
+    if not line.startswith(b'+'):
+        raise imaplib.IMAP4.error(f"IDLE refused: {line.strip().decode('utf-8', 'replace')}")
+
+    changed = False
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            mail.sock.settimeout(remaining)
+            try:
+                line = mail.readline()
+            except socket.timeout:
+                # A timed-out socket file refuses further reads; the socket itself is fine
+                mail.file = mail.sock.makefile('rb')
+                break
+            if not line or line.upper().startswith(b'* BYE'):
+                raise imaplib.IMAP4.abort("connection closed by server during IDLE")
+            if _CHANGED.match(line):
+                changed = True
+                break
+            # Anything else (EXPUNGE, flag changes) doesn't bring new reports
+    finally:
+        mail.sock.settimeout(IMAP_TIMEOUT)
+
+    mail.send(b'DONE\r\n')
+    while True:
+        line = mail.readline()
+        if not line:
+            raise imaplib.IMAP4.abort("connection closed by server after IDLE")
+        if line.startswith(tag + b' '):
+            if not line[len(tag) + 1:].upper().startswith(b'OK'):
+                raise imaplib.IMAP4.error(f"IDLE failed: {line.strip().decode('utf-8', 'replace')}")
+            return changed
+        if _CHANGED.match(line):
+            changed = True
+
+class MailboxWatcher:
+    """Keeps a mailbox's IMAP connection open and calls on_mail(pharmacy_config, mail, trigger) when it changes.
+
+    on_mail is also called after every (re)connect to catch up, and when an
+    IDLE period of idle_timeout seconds ends without news, as a safety net for
+    missed notifications. It may raise to force a reconnect.
+    """
+
+    def __init__(self, pharmacy_config, on_mail, idle_timeout=540, max_backoff=300):
+        self.pharmacy_config = pharmacy_config
+        self.code = pharmacy_config["code"]
+        self.on_mail = on_mail
+        self.idle_timeout = idle_timeout
+        self.max_backoff = max_backoff
+        self._stop = threading.Event()
+        self._thread = None
+        self._stats = {
+            "connected": False,
+            "supported": None,
+            "connects": 0,
+            "notifications": 0,
+            "last_event_at": None,
+            "last_error": None,
+            "next_retry_in": None
+        }
+
+    @property
+    def connected(self):
+        return self._stats["connected"]
+
+    def _session(self, mail):
+        if 'IDLE' not in mail.capabilities:
+            self._stats["supported"] = False
+            print(f"[IMAP] {self.code}: server does not support IDLE, leaving the mailbox to scheduled polling", flush=True)
+            return False
+        self._stats["supported"] = True
+        self._stats["connected"] = True
+        self._stats["connects"] += 1
+        self.on_mail(self.pharmacy_config, mail, 'connect')
+        while not self._stop.is_set():
+            status, _ = mail.select("inbox")
+            if status != "OK":
+                raise imaplib.IMAP4.error(f"Could not select inbox: {status}")
+            changed = idle_wait(mail, self.idle_timeout)
+            if self._stop.is_set():
+                break
+            if changed:
+                self._stats["notifications"] += 1
+                self._stats["last_event_at"] = datetime.utcnow().isoformat()
+                print(f"[IMAP] {self.code}: new mail", flush=True)
+            self.on_mail(self.pharmacy_config, mail, 'idle' if changed else 'idle_timeout')
+        return True
+
+    def _loop(self):
+        backoff = 0
+        while not self._stop.is_set():
+            mail = None
+            started = time.monotonic()
+            try:
+                mail = _get_imap_connection(self.pharmacy_config)
+                if not self._session(mail):
+                    return
+            except Exception as e:
+                self._stats["last_error"] = str(e)
+                # Double the wait on repeated failures; start over after a session that lasted
+                if time.monotonic() - started > self.max_backoff:
+                    backoff = 0
+                backoff = min(max(backoff * 2, 1), self.max_backoff)
+                print(f"[IMAP] {self.code}: connection lost ({e}), reconnecting in {backoff}s", flush=True)
+            finally:
+                self._stats["connected"] = False
+                if mail is not None:
+                    try:
+                        mail.logout()
+                    except Exception:
+                        pass
+            if self._stop.is_set():
+                break
+            self._stats["next_retry_in"] = backoff
+            self._stop.wait(backoff)
+            self._stats["next_retry_in"] = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name=f'imap-idle-{self.code}', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop after the current IDLE period ends."""
+        self._stop.set()
+
+    def status(self):
+        status = dict(self._stats)
+        status["idle_timeout_seconds"] = self.idle_timeout
+        return status
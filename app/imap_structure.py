@@ -0,0 +1,165 @@
+import base64
+import binascii
+import quopri
+import re
+
+# Parsing of IMAP FETCH responses for partial message downloads: ENVELOPE and
+# BODYSTRUCTURE tell us the subject, date and which MIME part holds the report,
+# so only that part is downloaded with BODY.PEEK[<section>].
+
+_LITERAL = re.compile(rb'\{(\d+)\}$')
+
+def _segments(data):
+    """imaplib FETCH data as a flat list of ('text', bytes) and ('literal', bytes) pieces."""
+    for item in data:
+        if isinstance(item, tuple):
+            yield 'text', item[0]
+            yield 'literal', item[1]
+        elif item:
+            yield 'text', item
+
+def _tokens(data):
+    """Atoms (str), quoted strings (str), literals (bytes), None for NIL, and '(' / ')' markers."""
+    for kind, piece in _segments(data):
+        if kind == 'literal':
+            yield 'value', piece
+            continue
+        match = _LITERAL.search(piece)
+        if match:
+            # The literal's bytes follow as the next segment
+            piece = piece[:match.start()]
+        i = 0
+        while i < len(piece):
+            c = piece[i:i + 1]
+            if c in b' \r\n':
+                i += 1
+            elif c in b'()':
+                yield c.decode(), None
+                i += 1
+            elif c == b'"':
+                value = bytearray()
+                i += 1
+                while i < len(piece) and piece[i:i + 1] != b'"':
+                    if piece[i:i + 1] == b'\\':
+                        i += 1
+                    value += piece[i:i + 1]
+                    i += 1
+                yield 'value', bytes(value).decode('utf-8', 'replace')
+                i += 1
+            else:
+                start = i
+                depth = 0
+                # Atoms stop at spaces and parentheses, except inside [...] (e.g. BODY[1.2])
+                while i < len(piece) and (depth or piece[i:i + 1] not in b' ()\r\n'):
+                    if piece[i:i + 1] == b'[':
+                        depth += 1
+                    elif piece[i:i + 1] == b']':
+                        depth -= 1
+                    i += 1
+                atom = piece[start:i].decode('utf-8', 'replace')
+                yield 'value', None if atom.upper() == 'NIL' else atom
+
+def parse_fetch_response(data):
+    """{uid: {item name: value}} from imaplib's UID FETCH data.
+
+    Parenthesized values become lists, NIL becomes None and literals stay bytes.
+    """
+    stack = [[]]
+    for kind, value in _tokens(data):
+        if kind == '(':
+            stack.append([])
+        elif kind == ')':
+            closed = stack.pop()
+            stack[-1].append(closed)
+        else:
+            stack[-1].append(value)
+
+    messages = {}
+    for entry in stack[0]:
+        if not isinstance(entry, list):
+            continue  # the message sequence number
+        items = {str(entry[i]).upper(): entry[i + 1] for i in range(0, len(entry) - 1, 2)}
+        if 'UID' in items:
+            messages[int(items['UID'])] = items
+    return messages
+
+def _text(value):
+    if isinstance(value, bytes):
+        return value.decode('utf-8', 'replace')
+    return value
+
+def _params(value):
+    """A BODYSTRUCTURE parameter list ("name" "value" ...) as a lower-cased dict."""
+    if not isinstance(value, list):
+        return {}
+    return {str(_text(value[i])).lower(): _text(value[i + 1]) for i in range(0, len(value) - 1, 2)}
+
+def iter_parts(structure, prefix=''):
+    """Yield (section, part) for every non-multipart part of a BODYSTRUCTURE.
+
+    part is a dict with type, subtype, params, encoding, size, disposition and filename.
+    """
+    if structure and isinstance(structure[0], list):
+        # multipart: child parts followed by the subtype and extension data
+        number = 0
+        for child in structure:
+            if not isinstance(child, list):
+                break
+            number += 1
+            yield from iter_parts(child, f"{prefix}{number}.")
+        return
+
+    content_type = str(_text(structure[0]) or '').lower()
+    subtype = str(_text(structure[1]) or '').lower()
+    params = _params(structure[2])
+    # Extension data (md5, disposition, ...) follows the basic fields: text parts
+    # add a line count, message/rfc822 parts an envelope, body and line count
+    if content_type == 'text':
+        extension_at = 8
+    elif (content_type, subtype) == ('message', 'rfc822'):
+        extension_at = 10
+    else:
+        extension_at = 7
+    disposition = structure[extension_at + 1] if len(structure) > extension_at + 1 else None
+    disposition_type, disposition_params = None, {}
+    if isinstance(disposition, list) and disposition:
+        disposition_type = str(_text(disposition[0])).lower()
+        disposition_params = _params(disposition[1] if len(disposition) > 1 else None)
+    yield (prefix.rstrip('.') or '1'), {
+        'type': content_type,
+        'subtype': subtype,
+        'params': params,
+        'encoding': str(_text(structure[5]) or '7bit').lower(),
+        'size': int(structure[6]) if structure[6] is not None else 0,
+        'disposition': disposition_type,
+        'filename': disposition_params.get('filename') or params.get('name'),
+    }
+
+def find_report_part(structure):
+    """(section, part) of the report: a .htm attachment, else the first inline HTML part, else (None, None).
+
+    Mirrors email_fetcher._report_content's preference order.
+    """
+    body = (None, None)
+    for section, part in iter_parts(structure):
+        filename = (part['filename'] or '').lower()
+        if filename.endswith('.htm') and part['disposition'] == 'attachment':
+            return section, part
+        if (part['type'], part['subtype']) == ('text', 'html') and part['disposition'] != 'attachment' and body[0] is None:
+            body = (section, part)
+    return body
+
+def decode_part(payload, encoding):
+    """Undo a part's Content-Transfer-Encoding."""
+    if encoding == 'base64':
+        try:
+            return base64.b64decode(payload)
+        except binascii.Error:
+            return base64.b64decode(payload + b'=' * (-len(payload) % 4))
+    if encoding == 'quoted-printable':
+        return quopri.decodestring(payload)
+    return payload
+
+def envelope_fields(envelope):
+    """(date header, raw subject header) from an ENVELOPE list."""
+    return _text(envelope[0]), _text(envelope[1])
@@ -0,0 +1,375 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import psutil
+from app.db import create_session
+from app.models import DailyReport, MailboxWatermark
+from app.parser import parse_html_daily
+from app.email_fetcher import fetch_emails_last_n_days, fetch_new_emails, sync_all_emails
+from app.imap_idle import MailboxWatcher
+from app.rollups import refresh_for_dates
+from app.data_version import bump_data_version
+from config import settings
+
+# Email ingestion: fetch each mailbox's daily report emails, parse them and
+# replace the matching DailyReport rows, then refresh the monthly rollups and
+# bump the pharmacy's data version so cached responses are invalidated.
+#
+# Incremental cycles only download messages above each mailbox's persisted
+# UID watermark (mailbox_watermarks); the first cycle, and any cycle after the
+# server changes UIDVALIDITY, searches the last `days` days instead.
+#
+# IngestionScheduler runs cycles in-process on a background thread, reusing
+# the loaded modules and the app's connection pool; scripts/fetch_latest.py
+# runs a single cycle and scripts/ingest_worker.py runs the scheduler as a
+# dedicated process. With IMAP_IDLE_ENABLED, start_idle_watchers() also keeps
+# a connection per mailbox in IMAP IDLE and ingests new mail as it arrives;
+# scheduled cycles then skip the mailboxes whose watcher is connected.
+
+# Mailboxes are fetched and parsed in parallel (up to `workers` at a time), so
+# a cycle takes about as long as its slowest mailbox. All database writes are
+# funnelled through the single ReportWriter thread below: SQLite shares a
+# single connection, and on PostgreSQL ingestion then holds at most one of the
+# small pool's connections.
+
+def _rss_mb():
+    return psutil.Process(os.getpid()).memory_info().rss / 1024 ** 2
+
+def save_report(session, pharmacy_code, report_date, data):
+    """Replace the pharmacy's report for report_date with data and commit."""
+    session.query(DailyReport).filter_by(
+        pharmacy_code=pharmacy_code,
+        report_date=report_date
+    ).delete(synchronize_session='fetch')
+    session.add(DailyReport(pharmacy_code=pharmacy_code, report_date=report_date, **data))
+    session.commit()
+
+def load_watermark(session, mailbox_code):
+    """{'uidvalidity', 'last_uid'} for a mailbox, both None before its first incremental sync."""
+    row = session.get(MailboxWatermark, mailbox_code)
+    if row is None:
+        return {'uidvalidity': None, 'last_uid': None}
+    return {'uidvalidity': row.uidvalidity, 'last_uid': row.last_uid}
+
+def save_watermark(session, mailbox_code, watermark):
+    """Persist and commit a mailbox's watermark."""
+    session.merge(MailboxWatermark(
+        mailbox_code=mailbox_code,
+        uidvalidity=watermark['uidvalidity'],
+        last_uid=watermark['last_uid'],
+        updated_at=datetime.utcnow()
+    ))
+    session.commit()
+
+def refresh_rollups(session, pharmacy_code, report_dates):
+    """Bring the monthly rollups of the months written back in line and invalidate cached responses."""
+    if refresh_for_dates(session, pharmacy_code, report_dates):
+        bump_data_version(session, pharmacy_code)
+
+class ReportWriter:
+    """Runs ingestion's database work on one thread.
+
+    submit(fn, *args) queues fn(session, *args) and returns a Future; work
+    runs in submission order, so a watermark queued after a report is only
+    saved once that report has been written. Each task gets its own session,
+    closed afterwards, so no transaction or pooled connection is held
+    between tasks.
+    """
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ingest-writer')
+
+    def _run(self, fn, args):
+        session = create_session()
+        try:
+            return fn(session, *args)
+        except Exception as e:
+            session.rollback()
+            print(f"[Ingest] Write failed ({fn.__name__}): {e}", flush=True)
+            raise
+        finally:
+            session.close()
+
+    def submit(self, fn, *args):
+        return self._executor.submit(self._run, fn, args)
+
+writer = ReportWriter()
+
+# A mailbox is only ingested by one thread at a time (a scheduled or manual
+# cycle, or its IDLE watcher), so its watermark is never read while stale
+_mailbox_locks = {}
+_mailbox_locks_guard = threading.Lock()
+
+def _mailbox_lock(code):
+    with _mailbox_locks_guard:
+        return _mailbox_locks.setdefault(code, threading.Lock())
+
+def _store_message(session, pharmacy_code, report_date, data, watermark, failed):
+    """Writer task for one handled message: save its report (if any), then advance the watermark (if any).
+
+    Once a write for the mailbox has failed (`failed` is set), later messages
+    are left alone so the watermark stays before the failed one and it is
+    fetched again next cycle. Returns True if a report was saved.
+    """
+    if failed.is_set():
+        return False
+    try:
+        if data is not None:
+            save_report(session, pharmacy_code, report_date, data)
+        if watermark is not None:
+            save_watermark(session, pharmacy_code, watermark)
+    except Exception:
+        failed.set()
+        raise
+    return data is not None
+
+def _without_uids(email_iter):
+    for report, report_date, subject in email_iter:
+        yield report, report_date, subject, None
+
+def ingest_mailbox(pharmacy_config, writer, days=7, fetch_all=False, incremental=True, memory_limit_mb=150, mail=None):
+    """Fetch and parse one mailbox's reports, storing them through writer. Returns a result dict.
+
+    Incremental runs fetch only messages after the mailbox's UID watermark
+    and advance it as each message is handled; fetch_all re-reads ~10 years
+    of email and leaves the watermark alone. Incremental runs can reuse an
+    open IMAP connection passed as mail.
+    """
+    with _mailbox_lock(pharmacy_config["code"]):
+        return _ingest_mailbox(pharmacy_config, writer, days, fetch_all, incremental, memory_limit_mb, mail)
+
+def _ingest_mailbox(pharmacy_config, writer, days, fetch_all, incremental, memory_limit_mb, mail):
+    code = pharmacy_config["code"]
+    pharmacy_name = pharmacy_config.get("name", code)
+    started = time.perf_counter()
+    result = {"pharmacy": code, "status": "ok", "messages": 0, "reports": 0, "dates": [], "error": None}
+
+    if not pharmacy_config.get("email_user") or not pharmacy_config.get("email_password"):
+        print(f"[Ingest] Missing email credentials for {pharmacy_name}, skipping", flush=True)
+        result["status"] = "skipped"
+        result["duration_seconds"] = 0.0
+        return result
+
+    pending = []
+    failed = threading.Event()
+    try:
+        watermark = None
+        if fetch_all:
+            email_iter = _without_uids(sync_all_emails(pharmacy_config))
+        elif incremental:
+            watermark = writer.submit(load_watermark, code).result()
+            email_iter = fetch_new_emails(pharmacy_config, watermark, days=days, mail=mail)
+        else:
+            email_iter = _without_uids(fetch_emails_last_n_days(pharmacy_config, days=days))
+
+        for report, report_date, subject, uid in email_iter:
+            if failed.is_set():
+                break
+            result["messages"] += 1
+            data = None
+            try:
+                # Forwarded emails don't contain the report
+                if "fwd:" in subject.lower():
+                    print(f"[Ingest] {code}: skipping forwarded email '{subject}'", flush=True)
+                elif report is None:
+                    print(f"[Ingest] {code}: no report in email '{subject}'", flush=True)
+                else:
+                    data = parse_html_daily(report)
+            except Exception as e:
+                print(f"[Ingest] {code}: failed to parse the report in '{subject}': {e}", flush=True)
+            # Release the payload before the memory check below
+            report = None
+
+            # Handled (even if unparseable): don't download it again, but
+            # only once its report is in the database
+            if uid is not None:
+                watermark['last_uid'] = uid
+            if data is not None or uid is not None:
+                future = writer.submit(_store_message, code, report_date, data,
+                                       dict(watermark) if uid is not None else None, failed)
+                if data is not None:
+                    pending.append((report_date, future))
+
+            if _rss_mb() > memory_limit_mb:
+                print(f"[Ingest] {code}: memory above {memory_limit_mb:.0f} MB, stopping early", flush=True)
+                result["status"] = "partial"
+                break
+    except Exception as e:
+        print(f"[Ingest] {code}: fetch failed: {e}", flush=True)
+        result["status"] = "error"
+        result["error"] = str(e)
+
+    saved_dates = []
+    for report_date, future in pending:
+        try:
+            if future.result():
+                saved_dates.append(report_date)
+                print(f"[Ingest] {code}: saved report for {report_date.isoformat()}", flush=True)
+        except Exception as e:
+            # Logged by the writer; the watermark stopped before this message
+            result["status"] = "error"
+            result["error"] = result["error"] or f"could not save report for {report_date.isoformat()}: {e}"
+    try:
+        writer.submit(refresh_rollups, code, saved_dates).result()
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = result["error"] or str(e)
+    # The writer is FIFO, so every write queued for this mailbox has run by now
+    if failed.is_set() and result["status"] != "error":
+        result["status"] = "error"
+        result["error"] = result["error"] or "database write failed, watermark not advanced"
+
+    result["reports"] = len(saved_dates)
+    result["dates"] = sorted({d.isoformat() for d in saved_dates})
+    result["duration_seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+def run_ingestion(mailboxes=None, workers=2, days=7, fetch_all=False, incremental=True, memory_limit_mb=150):
+    """One ingestion cycle over mailboxes, fetching at most `workers` mailboxes at a time. Returns a summary."""
+    mailboxes = settings.MAILBOXES if mailboxes is None else mailboxes
+    started_at = datetime.utcnow()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='ingest') as pool:
+        results = list(pool.map(
+            lambda mailbox: ingest_mailbox(mailbox, writer, days=days, fetch_all=fetch_all,
+                                           incremental=incremental, memory_limit_mb=memory_limit_mb),
+            mailboxes
+        ))
+    return {
+        "started_at": started_at.isoformat(),
+        "finished_at": datetime.utcnow().isoformat(),
+        "duration_seconds": round(time.perf_counter() - started, 3),
+        "messages": sum(r["messages"] for r in results),
+        "reports": sum(r["reports"] for r in results),
+        "errors": sum(1 for r in results if r["status"] == "error"),
+        "mailboxes": results
+    }
+
+# IMAP IDLE watchers by mailbox code, see start_idle_watchers()
+watchers = {}
+
+def _ingest_pushed(pharmacy_config, mail, trigger):
+    """MailboxWatcher callback: ingest new mail over the watcher's connection."""
+    result = ingest_mailbox(pharmacy_config, writer, days=settings.INGEST_DAYS,
+                            memory_limit_mb=settings.INGEST_MEMORY_LIMIT_MB, mail=mail)
+    if result["status"] == "error":
+        # Most likely a dead connection: let the watcher reconnect
+        raise Exception(result["error"])
+    if result["messages"]:
+        print(f"[Ingest] {pharmacy_config['code']}: {result['reports']} report(s) from {trigger} "
+              f"in {result['duration_seconds']:.1f}s", flush=True)
+
+def start_idle_watchers(mailboxes=None):
+    """Start an IDLE watcher for every mailbox with credentials (once per mailbox)."""
+    mailboxes = settings.MAILBOXES if mailboxes is None else mailboxes
+    for mailbox in mailboxes:
+        if mailbox.get("email_user") and mailbox.get("email_password") and mailbox["code"] not in watchers:
+            watchers[mailbox["code"]] = MailboxWatcher(
+                mailbox, _ingest_pushed,
+                idle_timeout=settings.IMAP_IDLE_TIMEOUT,
+                max_backoff=settings.IMAP_RECONNECT_MAX_BACKOFF
+            ).start()
+    return watchers
+
+def _polled_mailboxes():
+    """Mailboxes that scheduled cycles still need to poll."""
+    return [m for m in settings.MAILBOXES if not (m["code"] in watchers and watchers[m["code"]].connected)]
+
+class IngestionScheduler:
+    """Runs ingestion cycles every `interval` seconds on a daemon thread.
+
+    Only one cycle runs at a time; run_once() can also be called directly
+    (e.g. from /api/force_update) and returns None if a cycle is in progress.
+    """
+
+    def __init__(self, interval=600, initial_delay=300, workers=2, days=7, incremental=True, memory_limit_mb=200):
+        self.interval = interval
+        self.initial_delay = initial_delay
+        self.workers = workers
+        self.days = days
+        self.incremental = incremental
+        self.memory_limit_mb = memory_limit_mb
+        self._run_lock = threading.Lock()
+        self._thread = None
+        self._stats = {
+            "runs": 0,
+            "skipped_runs": 0,
+            "running": False,
+            "current_trigger": None,
+            "next_run_at": None,
+            "last_run": None,
+            "last_error": None
+        }
+
+    def run_once(self, trigger='manual'):
+        if not self._run_lock.acquire(blocking=False):
+            return None
+        try:
+            self._stats["running"] = True
+            self._stats["current_trigger"] = trigger
+            print(f"[Ingest] Cycle started ({trigger})", flush=True)
+            # Mailboxes with a connected IDLE watcher are already up to date
+            mailboxes = _polled_mailboxes() if trigger == 'scheduled' else None
+            summary = run_ingestion(mailboxes, workers=self.workers, days=self.days, incremental=self.incremental,
+                                    memory_limit_mb=self.memory_limit_mb)
+            summary["trigger"] = trigger
+            self._stats["runs"] += 1
+            self._stats["last_run"] = summary
+            print(f"[Ingest] Cycle finished in {summary['duration_seconds']:.1f}s: "
+                  f"{summary['reports']} report(s), {summary['errors']} mailbox error(s)", flush=True)
+            return summary
+        except Exception as e:
+            self._stats["last_error"] = str(e)
+            print(f"[Ingest] Cycle failed: {e}", flush=True)
+            raise
+        finally:
+            self._stats["running"] = False
+            self._stats["current_trigger"] = None
+            self._run_lock.release()
+
+    def _loop(self):
+        delay = self.initial_delay
+        while True:
+            self._stats["next_run_at"] = datetime.utcfromtimestamp(time.time() + delay).isoformat()
+            time.sleep(delay)
+            delay = self.interval
+            try:
+                memory = _rss_mb()
+                if memory > self.memory_limit_mb:
+                    self._stats["skipped_runs"] += 1
+                    print(f"[Ingest] Memory at {memory:.0f} MB (limit {self.memory_limit_mb:.0f} MB), skipping this cycle", flush=True)
+                    continue
+                self.run_once(trigger='scheduled')
+            except Exception:
+                # Already logged by run_once; keep the schedule going
+                pass
+
+    def start(self):
+        """Start the schedule on a daemon thread (once)."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name='ingest-scheduler', daemon=True)
+            self._thread.start()
+        return self
+
+    def status(self):
+        status = dict(self._stats)
+        status.update({
+            "enabled": self._thread is not None,
+            "interval_seconds": self.interval,
+            "workers": self.workers,
+            "days": self.days,
+            "incremental": self.incremental,
+            "idle_watchers": {code: watcher.status() for code, watcher in watchers.items()}
+        })
+        return status
+
+scheduler = IngestionScheduler(
+    interval=settings.INGEST_INTERVAL_SECONDS,
+    initial_delay=settings.INGEST_INITIAL_DELAY_SECONDS,
+    workers=settings.INGEST_WORKERS,
+    days=settings.INGEST_DAYS,
+    incremental=settings.INGEST_INCREMENTAL,
+    memory_limit_mb=settings.INGEST_MEMORY_LIMIT_MB
+)
@@ -0,0 +1,135 @@
+import calendar
+from datetime import date
+from sqlalchemy import case, extract, func, or_
+from app.models import DailyReport
+from app.aggregates import RangeScope, aggregate_range, first_value, last_value, range_filters, total
+
+# Stock-level queries for the inventory endpoints. These are written as
+# set-based statements (window functions over the range) so their cost does
+# not grow with the number of months or days probed.
+
+def _month_after(year, month):
+    return (year + 1, 1) if month == 12 else (year, month + 1)
+
+def _months_between(start, end):
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        yield year, month
+        year, month = _month_after(year, month)
+
+def monthly_stock_edges(session, pharmacy, first_month_start, last_month_end):
+    """Return {(year, month): (last positive closing, first positive opening)}.
+
+    Evaluated in one statement: each month's rows are ranked twice with
+    ROW_NUMBER(), newest-first for closing stock and oldest-first for opening
+    stock, and only the two winning rows per month are returned. Works on
+    SQLite (3.25+) and PostgreSQL.
+    """
+    year = extract('year', DailyReport.report_date)
+    month = extract('month', DailyReport.report_date)
+    has_closing = DailyReport.closing_stock_today > 0
+    has_opening = DailyReport.opening_stock_today > 0
+    ranked = session.query(
+        year.label('year'),
+        month.label('month'),
+        DailyReport.closing_stock_today.label('closing_stock'),
+        DailyReport.opening_stock_today.label('opening_stock'),
+        func.row_number().over(
+            partition_by=(year, month),
+            order_by=(case((has_closing, 0), else_=1), DailyReport.report_date.desc())
+        ).label('closing_rank'),
+        func.row_number().over(
+            partition_by=(year, month),
+            order_by=(case((has_opening, 0), else_=1), DailyReport.report_date.asc())
+        ).label('opening_rank')
+    ).filter(
+        *range_filters(RangeScope(pharmacy, first_month_start, last_month_end)),
+        or_(has_closing, has_opening)
+    ).subquery()
+
+    edges = {}
+    rows = session.query(ranked).filter(
+        or_(ranked.c.closing_rank == 1, ranked.c.opening_rank == 1)
+    ).all()
+    for row in rows:
+        key = (int(row.year), int(row.month))
+        closing, opening = edges.get(key, (None, None))
+        if row.closing_rank == 1 and row.closing_stock and row.closing_stock > 0:
+            closing = row.closing_stock
+        if row.opening_rank == 1 and row.opening_stock and row.opening_stock > 0:
+            opening = row.opening_stock
+        edges[key] = (closing, opening)
+    return edges
+
+def monthly_closing_stock(session, pharmacy, start_date_obj, end_date_obj):
+    """Closing stock per month, falling back to the next month's first opening stock."""
+    months = list(_months_between(start_date_obj, end_date_obj))
+    if not months:
+        return []
+    fallback_year, fallback_month = _month_after(*months[-1])
+    last_day = calendar.monthrange(fallback_year, fallback_month)[1]
+    edges = monthly_stock_edges(
+        session,
+        pharmacy,
+        date(months[0][0], months[0][1], 1).isoformat(),
+        date(fallback_year, fallback_month, last_day).isoformat()
+    )
+
+    monthly = []
+    for year, month in months:
+        closing_stock_value, _ = edges.get((year, month), (None, None))
+        fallback_used = False
+        if not closing_stock_value:
+            _, next_opening = edges.get(_month_after(year, month), (None, None))
+            if next_opening:
+                closing_stock_value = next_opening
+                fallback_used = True
+        monthly.append({
+            "month": f"{year}-{month:02d}",
+            "month_name": date(year, month, 1).strftime('%b %Y'),
+            "closing_stock": round(closing_stock_value or 0, 2),
+            "fallback_used": fallback_used
+        })
+    return monthly
+
+def inventory_metrics(session, pharmacy, start_date, end_date):
+    """Cost of sales over the range plus the stock levels around it, in one statement.
+
+    Opening stock is the first positive value on or after start_date and
+    closing stock the last positive value on or before end_date; neither is
+    bounded by the other end of the range, so a range that starts or ends on
+    a day without a report still finds the nearest stock take.
+    """
+    values = aggregate_range(session, RangeScope(pharmacy, start_date, end_date), {
+        'cost_of_sales': total(DailyReport.cost_of_sales_today),
+        'opening_stock': first_value(RangeScope(pharmacy, start_date, None), 'opening_stock_today', positive=True),
+        'closing_stock': last_value(RangeScope(pharmacy, None, end_date), 'closing_stock_today', positive=True)
+    })
+    return {
+        'cost_of_sales': values['cost_of_sales'] or 0,
+        'opening_stock': values['opening_stock'] or 0,
+        'closing_stock': values['closing_stock'] or 0
+    }
+
+def turnover_ratio(values):
+    """Inventory turnover (times per period) from inventory_metrics() values."""
+    stock = values['opening_stock'] + values['closing_stock']
+    average_inventory = stock / 2 if stock > 0 else 1
+    ratio = values['cost_of_sales'] / average_inventory if average_inventory > 0 else 0
+    return {
+        'turnover_ratio': round(ratio, 2),
+        'cost_of_sales': round(values['cost_of_sales'], 2),
+        'average_inventory': round(average_inventory, 2)
+    }
+
+def days_of_inventory(values, start_date_obj, end_date_obj):
+    """Days the closing stock would last at the range's average daily cost of sales."""
+    days_in_period = (end_date_obj - start_date_obj).days + 1
+    avg_daily_cost_of_sales = values['cost_of_sales'] / days_in_period if days_in_period > 0 else 0
+    current_inventory = values['closing_stock']
+    days = current_inventory / avg_daily_cost_of_sales if avg_daily_cost_of_sales > 0 else 0
+    return {
+        'days_of_inventory': round(days, 1),
+        'current_inventory': round(current_inventory, 2),
+        'avg_daily_cost_of_sales': round(avg_daily_cost_of_sales, 2)
+    }
@@ -0,0 +1,99 @@
+import gc
+import os
+import threading
+import time
+import psutil
+from config.settings import GC_MODE, GC_RSS_THRESHOLD_MB, GC_REQUEST_INTERVAL, GC_THRESHOLDS
+
+# Adaptive garbage collection for the API process. Instead of a full
+# gc.collect() after every request, collections are triggered by RSS or by
+# request count, and every collection's pause is timed through gc.callbacks
+# so the cost can be reported per request and on /api/status.
+
+_lock = threading.Lock()
+_stats = {
+    "collections": 0,
+    "pause_total_ms": 0.0,
+    "pause_max_ms": 0.0,
+    "forced_collections": 0,
+    "forced_by_rss": 0,
+    "forced_by_requests": 0,
+    "requests": 0,
+    "requests_since_collect": 0,
+    "last_forced_reason": None,
+    "last_rss_mb": None,
+}
+_collection_started = {}
+
+def _gc_callback(phase, info):
+    # Runs in whichever thread triggered the collection; the GIL is held
+    # throughout, so the pause applies to every in-flight request.
+    if phase == "start":
+        _collection_started[threading.get_ident()] = time.perf_counter()
+        return
+    started = _collection_started.pop(threading.get_ident(), None)
+    if started is None:
+        return
+    pause_ms = (time.perf_counter() - started) * 1000
+    _stats["collections"] += 1
+    _stats["pause_total_ms"] += pause_ms
+    if pause_ms > _stats["pause_max_ms"]:
+        _stats["pause_max_ms"] = pause_ms
+
+def configure_gc():
+    """Apply generation thresholds, freeze startup objects and start timing collections."""
+    try:
+        thresholds = tuple(int(v) for v in GC_THRESHOLDS.split(","))
+        gc.set_threshold(*thresholds)
+    except ValueError:
+        print(f"[Memory] Ignoring invalid GC_THRESHOLDS '{GC_THRESHOLDS}'", flush=True)
+    # Objects alive after startup (modules, ORM mappers, config) are never
+    # garbage; moving them out of the tracked generations makes every later
+    # full collection cheaper.
+    if hasattr(gc, "freeze"):
+        gc.freeze()
+    if _gc_callback not in gc.callbacks:
+        gc.callbacks.append(_gc_callback)
+    print(f"[Memory] GC mode={GC_MODE} thresholds={gc.get_threshold()} "
+          f"rss_threshold={GC_RSS_THRESHOLD_MB}MB request_interval={GC_REQUEST_INTERVAL}", flush=True)
+
+def gc_pause_total_ms():
+    """Cumulative GC pause time in this process, for per-request deltas."""
+    return _stats["pause_total_ms"]
+
+def _rss_mb():
+    return psutil.Process(os.getpid()).memory_info().rss / 1024 ** 2
+
+def maybe_collect():
+    """Count a finished request and run a full collection if the policy calls for one."""
+    with _lock:
+        _stats["requests"] += 1
+        _stats["requests_since_collect"] += 1
+        if GC_MODE == "always":
+            reason = "always"
+        else:
+            rss = _rss_mb()
+            _stats["last_rss_mb"] = round(rss, 2)
+            if rss > GC_RSS_THRESHOLD_MB:
+                reason = "rss"
+                _stats["forced_by_rss"] += 1
+            elif _stats["requests_since_collect"] >= GC_REQUEST_INTERVAL:
+                reason = "requests"
+                _stats["forced_by_requests"] += 1
+            else:
+                return None
+        _stats["requests_since_collect"] = 0
+        _stats["forced_collections"] += 1
+        _stats["last_forced_reason"] = reason
+    gc.collect()
+    return reason
+
+def gc_stats():
+    """Snapshot of GC configuration and counters for /api/status."""
+    stats = dict(_stats)
+    stats["pause_total_ms"] = round(stats["pause_total_ms"], 2)
+    stats["pause_max_ms"] = round(stats["pause_max_ms"], 2)
+    stats["mode"] = GC_MODE
+    stats["thresholds"] = list(gc.get_threshold())
+    stats["generation_counts"] = list(gc.get_count())
+    return stats
@@ -0,0 +1,330 @@
+from sqlalchemy import and_, func
+from app.models import DailyReport, MonthlyRollup
+from app.aggregates import RangeScope, aggregate_range, average, count, last_value, pharmacy_list, range_filters, total
+from app.rollups import period_filters, whole_months
+from app.json_provider import dumps
+
+# Dashboard metrics shared by the *_for_range endpoints and the batched
+# /metrics_for_range endpoint. Aggregate metrics are described by the SQL
+# expressions they need and a finalizer that turns the resulting scalars into
+# the endpoint payload; daily series are built from column-projected tuples.
+
+C = DailyReport
+R = MonthlyRollup
+
+# Rows fetched per round trip when walking a daily series
+SERIES_BATCH_SIZE = 500
+
+def _format_date(value):
+    # Scalar subqueries come back as date objects or ISO strings depending on the backend
+    return value.strftime('%Y-%m-%d') if hasattr(value, 'strftime') else value
+
+def _avg_basket(scope):
+    valid = C.avg_value_per_basket > 0
+    return {
+        'value': average(C.avg_value_per_basket, valid),
+        'size': average(func.coalesce(C.avg_items_per_basket, 0), valid),
+        'days': count(valid)
+    }
+
+def _gp(scope):
+    valid = C.stock_gross_profit_percent_today != 0
+    return {
+        'avg_percent': average(C.stock_gross_profit_percent_today, valid),
+        'days': count(valid),
+        'value': total(C.stock_gross_profit_today)
+    }
+
+def _dispensary_vs_total_turnover(values):
+    dispensary_turnover = values['dispensary']
+    total_turnover = values['total']
+    percent = (dispensary_turnover / total_turnover * 100) if total_turnover else 0
+    return {
+        'dispensary_turnover': round(dispensary_turnover, 2),
+        'total_turnover': round(total_turnover, 2),
+        'percent': round(percent, 2)
+    }
+
+def _closing_stock(values):
+    closing_stock = values['value'] or 0
+    return {
+        'closing_stock': round(closing_stock, 2),
+        'date_used': _format_date(values['date'])
+    }
+
+AGGREGATE_METRICS = {
+    'turnover': (
+        lambda scope: {'turnover': total(C.total_turnover_today)},
+        lambda v: {'turnover': v['turnover']}
+    ),
+    'avg_basket': (
+        _avg_basket,
+        lambda v: {
+            'avg_basket_value': round(v['value'] or 0, 2),
+            'avg_basket_size': round(v['size'] or 0, 2),
+            'days_counted': v['days']
+        }
+    ),
+    'gp': (
+        _gp,
+        lambda v: {
+            'avg_gp_percent': round(v['avg_percent'] or 0, 2),
+            'cumulative_gp_value': round(v['value'], 2),
+            'days_counted': v['days']
+        }
+    ),
+    'costs': (
+        lambda scope: {'cost_of_sales': total(C.cost_of_sales_today), 'purchases': total(C.stock_purchases_today)},
+        lambda v: {'cost_of_sales': round(v['cost_of_sales'], 2), 'purchases': round(v['purchases'], 2)}
+    ),
+    'transactions': (
+        lambda scope: {'transactions': total(C.sales_total_trans_today), 'scripts': total(C.scripts_dispensed_today)},
+        lambda v: {'total_transactions': int(v['transactions']), 'total_scripts': int(v['scripts'])}
+    ),
+    'dispensary_vs_total_turnover': (
+        lambda scope: {'dispensary': total(C.dispensary_turnover_today), 'total': total(C.total_turnover_today)},
+        _dispensary_vs_total_turnover
+    ),
+    'stock_adjustments': (
+        lambda scope: {'adjustments': total(C.stock_adjustments_today)},
+        lambda v: {'stock_adjustments': round(v['adjustments'], 2)}
+    ),
+    'closing_stock': (
+        lambda scope: {
+            'value': last_value(scope, 'closing_stock_today'),
+            'date': last_value(scope, 'closing_stock_today', 'report_date')
+        },
+        _closing_stock
+    ),
+}
+
+# Equivalent expressions over monthly_rollups, used instead of the daily
+# expressions above when a range covers whole months. Labels match, so the
+# same finalizers apply.
+
+def _ratio(numerator, denominator):
+    return total(numerator) / func.nullif(total(denominator), 0)
+
+ROLLUP_METRICS = {
+    'turnover': {'turnover': total(R.total_turnover)},
+    'avg_basket': {
+        'value': _ratio(R.basket_value_sum, R.basket_days),
+        'size': _ratio(R.basket_items_sum, R.basket_days),
+        'days': total(R.basket_days)
+    },
+    'gp': {
+        'avg_percent': _ratio(R.gp_percent_sum, R.gp_percent_days),
+        'days': total(R.gp_percent_days),
+        'value': total(R.gross_profit)
+    },
+    'costs': {'cost_of_sales': total(R.cost_of_sales), 'purchases': total(R.purchases)},
+    'transactions': {'transactions': total(R.transactions), 'scripts': total(R.scripts_dispensed)},
+    'dispensary_vs_total_turnover': {'dispensary': total(R.dispensary_turnover), 'total': total(R.total_turnover)},
+    'stock_adjustments': {'adjustments': total(R.stock_adjustments)},
+}
+
+# Daily series are (response key, projected columns, value key, value). The
+# value function receives the projected column values of one row and returns
+# that day's value; rows come out as {"date": ..., <value key>: value} or, in
+# columnar form, as parallel "dates" and "values" lists.
+
+def _number(convert=None):
+    def value(raw):
+        raw = raw or 0
+        return convert(raw) if convert else raw
+    return value
+
+def _round_basket(value):
+    return round(value, 2) if value else 0
+
+def _gp_percent(gp_percent):
+    return gp_percent if gp_percent is not None else 0
+
+def _dispensary_percent(dispensary_turnover, total_turnover):
+    if total_turnover and total_turnover != 0:
+        return (dispensary_turnover or 0) / total_turnover * 100
+    return 0
+
+SERIES_METRICS = {
+    'daily_turnover': ('daily_turnover', (C.total_turnover_today,), 'turnover', _number()),
+    'daily_avg_basket': ('daily_avg_basket', (C.avg_value_per_basket,), 'avg_basket_value', _number(_round_basket)),
+    'daily_purchases': ('daily_purchases', (C.stock_purchases_today,), 'purchases', _number()),
+    'daily_cost_of_sales': ('daily_cost_of_sales', (C.cost_of_sales_today,), 'cost_of_sales', _number()),
+    'daily_cash_sales': ('daily_cash_sales', (C.cash_sales_today,), 'cash_sales', _number()),
+    'daily_account_sales': ('daily_account_sales', (C.account_sales_today,), 'account_sales', _number()),
+    'daily_cod_sales': ('daily_cod_sales', (C.cod_sales_today,), 'cod_sales', _number()),
+    'daily_cash_tenders': ('daily_cash_tenders', (C.cash_tenders_today,), 'cash_tenders_today', _number()),
+    'daily_credit_card_tenders': ('daily_credit_card_tenders', (C.credit_card_tenders_today,), 'credit_card_tenders_today', _number()),
+    'daily_scripts_dispensed': ('daily_scripts_dispensed', (C.scripts_dispensed_today,), 'scripts_dispensed', _number(int)),
+    'daily_gp_percent': ('daily_gp_percent', (C.stock_gross_profit_percent_today,), 'gp_percent', _gp_percent),
+    'daily_dispensary_percent': ('daily_dispensary_percent', (C.dispensary_turnover_today, C.total_turnover_today), 'dispensary_percent', _dispensary_percent),
+    'daily_dispensary_turnover': ('daily_dispensary_turnover', (C.dispensary_turnover_today,), 'dispensary_turnover', _number()),
+}
+
+METRIC_NAMES = list(AGGREGATE_METRICS) + list(SERIES_METRICS)
+
+# Aggregates that only use plain column aggregates, so several pharmacies can
+# share one GROUP BY. closing_stock needs per-pharmacy subqueries.
+GROUP_METRIC_NAMES = [name for name in AGGREGATE_METRICS if name != 'closing_stock']
+
+def parse_fields(fields_param, names=METRIC_NAMES):
+    """Split a comma-separated ?fields= value. Returns (fields, unknown_fields)."""
+    if not fields_param:
+        return list(names), []
+    fields = []
+    for name in fields_param.split(','):
+        name = name.strip()
+        if name and name not in fields:
+            fields.append(name)
+    unknown = [name for name in fields if name not in names]
+    return fields, unknown
+
+def _namespaced(expressions_by_name):
+    # Labels are namespaced per metric so several metrics share one SELECT
+    expressions = {}
+    for name, own in expressions_by_name.items():
+        for label, expression in own.items():
+            expressions[f'{name}__{label}'] = expression
+    return expressions
+
+def _finalize(names, values):
+    payloads = {}
+    for name in names:
+        prefix = f'{name}__'
+        own = {label[len(prefix):]: value for label, value in values.items() if label.startswith(prefix)}
+        payloads[name] = AGGREGATE_METRICS[name][1](own)
+    return payloads
+
+def _aggregate_payloads(session, scope, names):
+    expressions = _namespaced({name: AGGREGATE_METRICS[name][0](scope) for name in names})
+    return _finalize(names, aggregate_range(session, scope, expressions))
+
+def _rollup_payloads(session, scope, months, names):
+    expressions = _namespaced({name: ROLLUP_METRICS[name] for name in names})
+    labels = list(expressions)
+    row = session.query(
+        *[expressions[label].label(label) for label in labels]
+    ).filter(*period_filters(scope.pharmacy, *months)).one()
+    return _finalize(names, {label: row[i] for i, label in enumerate(labels)})
+
+def query_series(session, scope, columns):
+    """Yield (report_date, *values) tuples for the range in date order.
+
+    Only report_date and the given columns are selected, and rows are fetched
+    in batches rather than materialised as DailyReport objects.
+    """
+    return session.query(DailyReport.report_date, *columns).filter(
+        *range_filters(scope)
+    ).order_by(DailyReport.report_date).yield_per(SERIES_BATCH_SIZE)
+
+def _series_columns(names):
+    # One projection covering every requested series, plus each series' positions in it
+    columns = []
+    positions = {}
+    for name in names:
+        indexes = []
+        for column in SERIES_METRICS[name][1]:
+            keys = [c.key for c in columns]
+            if column.key not in keys:
+                columns.append(column)
+                keys.append(column.key)
+            indexes.append(keys.index(column.key) + 1)
+        positions[name] = indexes
+    return columns, positions
+
+def _series_payloads(session, scope, names, columnar=False):
+    columns, positions = _series_columns(names)
+    dates = []
+    values = {name: [] for name in names}
+    for row in query_series(session, scope, columns):
+        dates.append(row[0].isoformat())
+        for name in names:
+            values[name].append(SERIES_METRICS[name][3](*[row[i] for i in positions[name]]))
+    if columnar:
+        return {name: columnar_series(name, dates, values[name]) for name in names}
+    payloads = {}
+    for name in names:
+        key, _, value_key, _ = SERIES_METRICS[name]
+        payloads[name] = {key: [{"date": date, value_key: value} for date, value in zip(dates, values[name])]}
+    return payloads
+
+def columnar_series(name, dates, values):
+    """Columnar form of a daily series: parallel date and value lists."""
+    key, _, value_key, _ = SERIES_METRICS[name]
+    return {"series": key, "value_key": value_key, "dates": dates, "values": values}
+
+def series_columns(session, name, pharmacy, start_date, end_date):
+    """A daily series endpoint's payload in columnar form."""
+    return compute_metrics(session, pharmacy, start_date, end_date, [name], columnar=True)[name]
+
+def stream_series(session, name, pharmacy, start_date, end_date):
+    """Yield a daily series endpoint's JSON document in chunks as rows arrive."""
+    key, columns, value_key, value = SERIES_METRICS[name]
+    yield '{"pharmacy": %s, %s: [' % (dumps(pharmacy), dumps(key))
+    chunk = []
+    separator = ''
+    for row in query_series(session, RangeScope(pharmacy, start_date, end_date), columns):
+        chunk.append(separator + dumps({"date": row[0].isoformat(), value_key: value(*row[1:])}))
+        separator = ', '
+        if len(chunk) >= SERIES_BATCH_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+    chunk.append(']}')
+    yield ''.join(chunk)
+
+def compute_metrics(session, pharmacy, start_date, end_date, fields, columnar=False):
+    """Build each requested metric payload, exactly as its *_for_range endpoint returns it.
+
+    All aggregates are evaluated in a single SQL statement (read from the
+    monthly rollups when the range covers whole months) and all daily series
+    share a single column-projected query. With columnar=True, daily series
+    are returned as parallel "dates"/"values" lists.
+    """
+    scope = RangeScope(pharmacy, start_date, end_date)
+    months = whole_months(start_date, end_date)
+    rollup_names = [name for name in fields if months and name in ROLLUP_METRICS]
+    aggregate_names = [name for name in fields if name in AGGREGATE_METRICS and name not in rollup_names]
+    series_names = [name for name in fields if name in SERIES_METRICS]
+    payloads = {}
+    if rollup_names:
+        payloads.update(_rollup_payloads(session, scope, months, rollup_names))
+    if aggregate_names:
+        payloads.update(_aggregate_payloads(session, scope, aggregate_names))
+    if series_names:
+        payloads.update(_series_payloads(session, scope, series_names, columnar))
+    metrics = {}
+    for name in fields:
+        payload = {'pharmacy': pharmacy}
+        payload.update(payloads[name])
+        metrics[name] = payload
+    return metrics
+
+def range_metric(session, name, pharmacy, start_date, end_date):
+    """Payload for a single metric over the range."""
+    return compute_metrics(session, pharmacy, start_date, end_date, [name])[name]
+
+def compare_pharmacies(session, pharmacies, start_date, end_date, fields):
+    """{pharmacy: {metric: payload}} for several pharmacies from one GROUP BY pharmacy_code.
+
+    The pharmacy list is left-joined to the range's reports so pharmacies
+    without data still get (zero) payloads.
+    """
+    if not pharmacies:
+        return {}
+    scope = RangeScope(None, start_date, end_date)
+    expressions = _namespaced({name: AGGREGATE_METRICS[name][0](scope) for name in fields})
+    labels = list(expressions)
+    codes = pharmacy_list(pharmacies)
+    rows = session.query(
+        codes.c.pharmacy_code,
+        *[expressions[label].label(label) for label in labels]
+    ).select_from(codes).outerjoin(C, and_(
+        C.pharmacy_code == codes.c.pharmacy_code,
+        C.report_date >= start_date,
+        C.report_date <= end_date
+    )).group_by(codes.c.pharmacy_code).all()
+
+    compared = {}
+    for row in rows:
+        compared[row[0]] = _finalize(fields, {label: row[i + 1] for i, label in enumerate(labels)})
+    return {pharmacy: compared[pharmacy] for pharmacy in pharmacies}
@@ -0,0 +1,70 @@
+from datetime import datetime
+from sqlalchemy import inspect, text
+from app.models import DailyReport, SchemaMigration
+
+# Schema migrations for changes create_all() cannot make to an existing
+# database (indexes, constraints on populated tables). Each migration runs in
+# its own transaction and is recorded in schema_migrations; app.db applies
+# pending ones at startup and scripts/migrate.py runs them by hand.
+#
+# Append new migrations to MIGRATIONS; never renumber or edit applied ones.
+
+# Serialises migrations across gunicorn workers starting at the same time
+_PG_LOCK_ID = 7240311
+
+def _has_pharmacy_day_index(connection):
+    inspector = inspect(connection)
+    leading = [c['column_names'][:2] for c in inspector.get_unique_constraints('daily_reports')]
+    partial = {i.name for i in DailyReport.__table__.indexes}
+    leading += [i['column_names'][:2] for i in inspector.get_indexes('daily_reports') if i['name'] not in partial]
+    return ['pharmacy_code', 'report_date'] in leading
+
+def _pharmacy_day_index(connection):
+    # Databases provisioned before _pharmacy_day_uc existed have no index on
+    # the columns every range query filters on.
+    if not _has_pharmacy_day_index(connection):
+        connection.execute(text(
+            "CREATE INDEX ix_daily_reports_pharmacy_date ON daily_reports (pharmacy_code, report_date)"
+        ))
+
+def _partial_stock_and_turnover_indexes(connection):
+    for index in DailyReport.__table__.indexes:
+        index.create(connection, checkfirst=True)
+    # Refresh planner statistics so the new indexes are considered straight away
+    connection.execute(text("ANALYZE daily_reports"))
+
+# (version, description, upgrade(connection))
+MIGRATIONS = [
+    ('0001', 'Index daily_reports on (pharmacy_code, report_date)', _pharmacy_day_index),
+    ('0002', 'Partial covering indexes for closing stock, positive opening stock and positive turnover',
+     _partial_stock_and_turnover_indexes),
+]
+
+def applied_versions(connection):
+    return {row[0] for row in connection.execute(text("SELECT version FROM schema_migrations"))}
+
+def pending_migrations(engine):
+    SchemaMigration.__table__.create(engine, checkfirst=True)
+    with engine.connect() as connection:
+        applied = applied_versions(connection)
+    return [m for m in MIGRATIONS if m[0] not in applied]
+
+def run_migrations(engine):
+    """Apply pending migrations in order. Returns the versions applied."""
+    applied_now = []
+    for version, description, upgrade in pending_migrations(engine):
+        with engine.begin() as connection:
+            if connection.dialect.name == 'postgresql':
+                connection.execute(text("SELECT pg_advisory_xact_lock(:id)"), {'id': _PG_LOCK_ID})
+                # Another worker may have applied it while we waited for the lock
+                if version in applied_versions(connection):
+                    continue
+            upgrade(connection)
+            connection.execute(SchemaMigration.__table__.insert().values(
+                version=version,
+                description=description,
+                applied_at=datetime.utcnow()
+            ))
+        print(f"[Migrations] Applied {version}: {description}", flush=True)
+        applied_now.append(version)
+    return applied_now
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Date, UniqueConstraint
+from sqlalchemy import BigInteger, Column, Integer, String, Float, Date, DateTime, Index, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -69,4 +69,95 @@ class DailyReport(Base):
 
     __table_args__ = (
         UniqueConstraint("pharmacy_code", "report_date", name="_pharmacy_day_uc"),
-    ) 
\ No newline at end of file
+        # Partial indexes for the hot lookups. The looked-up value is a trailing
+        # key column so both PostgreSQL and SQLite answer from the index alone.
+        # Existing databases get these through app.migrations.
+        Index(
+            "ix_daily_reports_closing_stock",
+            "pharmacy_code", "report_date", "closing_stock_today",
+            postgresql_where=closing_stock_today.isnot(None),
+            sqlite_where=closing_stock_today.isnot(None)
+        ),
+        Index(
+            "ix_daily_reports_opening_stock_positive",
+            "pharmacy_code", "report_date", "opening_stock_today",
+            postgresql_where=opening_stock_today > 0,
+            sqlite_where=opening_stock_today > 0
+        ),
+        Index(
+            "ix_daily_reports_turnover_positive",
+            "pharmacy_code", "report_date", "total_turnover_today",
+            postgresql_where=total_turnover_today > 0,
+            sqlite_where=total_turnover_today > 0
+        ),
+    )
+
+class MonthlyRollup(Base):
+    """Per-pharmacy monthly totals of DailyReport, maintained by app.rollups.
+
+    Averages are stored as a sum plus the number of days that contributed,
+    so months can be combined into exact multi-month averages.
+    """
+    __tablename__ = "monthly_rollups"
+
+    id = Column(Integer, primary_key=True)
+    pharmacy_code = Column(String, nullable=False)
+    year = Column(Integer, nullable=False)
+    month = Column(Integer, nullable=False)
+    report_count = Column(Integer, nullable=False, default=0)
+
+    # SUMMED METRICS
+    total_turnover = Column(Float, default=0)
+    dispensary_turnover = Column(Float, default=0)
+    gross_profit = Column(Float, default=0)
+    cost_of_sales = Column(Float, default=0)
+    purchases = Column(Float, default=0)
+    stock_adjustments = Column(Float, default=0)
+    transactions = Column(Float, default=0)
+    scripts_dispensed = Column(Float, default=0)
+
+    # AVERAGED METRICS (sum over qualifying days + day count)
+    basket_value_sum = Column(Float, default=0)
+    basket_items_sum = Column(Float, default=0)
+    basket_days = Column(Integer, default=0)
+    gp_percent_sum = Column(Float, default=0)
+    gp_percent_days = Column(Integer, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("pharmacy_code", "year", "month", name="_pharmacy_month_uc"),
+    )
+
+
+class DataVersion(Base):
+    """Per-pharmacy counter bumped whenever that pharmacy's reports are written.
+
+    Lives in the database so every worker process and the fetch scripts see
+    the same value; response caches compare against it to invalidate.
+    """
+    __tablename__ = "data_versions"
+
+    pharmacy_code = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime)
+
+class SchemaMigration(Base):
+    """One row per migration in app.migrations that has been applied."""
+    __tablename__ = "schema_migrations"
+
+    version = Column(String, primary_key=True)
+    description = Column(String)
+    applied_at = Column(DateTime)
+
+class MailboxWatermark(Base):
+    """Per-mailbox IMAP sync position: the highest UID ingested under a UIDVALIDITY.
+
+    A UIDVALIDITY change means the server renumbered the mailbox, so the
+    watermark is discarded and the mailbox is searched by date again.
+    """
+    __tablename__ = "mailbox_watermarks"
+
+    mailbox_code = Column(String, primary_key=True)
+    # Unsigned 32-bit on the server, so BigInteger to fit PostgreSQL
+    uidvalidity = Column(BigInteger, nullable=False)
+    last_uid = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime)
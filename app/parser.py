@@ -39,10 +39,16 @@ def clean_int(val_str):
         # print(f"ValueError converting '{val_str}' (cleaned: '{cleaned}') to int.")
         return 0
 
-def parse_html_daily(file_path):
+def parse_html_daily(source):
+    """Parse a daily report given as raw bytes, HTML text, or a path to the .htm file."""
     # Correct encoding based on HTML <meta http-equiv=Content-Type content=text/html; charset=windows-1252>
-    with open(file_path, 'r', encoding='windows-1252') as f:
-        soup = BeautifulSoup(f, 'html.parser')
+    if isinstance(source, (bytes, bytearray)):
+        soup = BeautifulSoup(bytes(source).decode('windows-1252', errors='replace'), 'html.parser')
+    elif isinstance(source, str) and '<' in source:
+        soup = BeautifulSoup(source, 'html.parser')
+    else:
+        with open(source, 'r', encoding='windows-1252') as f:
+            soup = BeautifulSoup(f, 'html.parser')
 
     # Initialize data dictionary with defaults for all fields to ensure they exist
     data = {
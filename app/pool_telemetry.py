@@ -0,0 +1,118 @@
+import threading
+import time
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+# Connection pool telemetry for app.db: how long requests wait to check out a
+# connection and how often the pool is exhausted. Reported on /api/status so
+# DB_POOL_SIZE / DB_MAX_OVERFLOW can be sized from observed data.
+
+# Upper bounds (ms) of the checkout wait histogram buckets
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 20000)
+
+class PoolStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.saturated_checkouts = 0
+        self.timeouts = 0
+        self.wait_total_ms = 0.0
+        self.wait_max_ms = 0.0
+        self.peak_checked_out = 0
+        self.buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+
+    def record(self, wait_ms, saturated, checked_out, timed_out=False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            if saturated:
+                self.saturated_checkouts += 1
+            self.wait_total_ms += wait_ms
+            self.wait_max_ms = max(self.wait_max_ms, wait_ms)
+            self.peak_checked_out = max(self.peak_checked_out, checked_out)
+            for i, bound in enumerate(WAIT_BUCKETS_MS):
+                if wait_ms <= bound:
+                    self.buckets[i] += 1
+                    break
+            else:
+                self.buckets[-1] += 1
+
+    def snapshot(self):
+        with self._lock:
+            attempts = self.checkouts + self.timeouts
+            # Cumulative counts, as in a Prometheus histogram
+            histogram = {}
+            running = 0
+            for bound, count in zip(WAIT_BUCKETS_MS + ('+Inf',), self.buckets):
+                running += count
+                histogram[f"le_{bound}ms" if bound != '+Inf' else "le_inf"] = running
+            return {
+                "checkouts": self.checkouts,
+                "saturated_checkouts": self.saturated_checkouts,
+                "timeouts": self.timeouts,
+                "saturation_rate": round((self.saturated_checkouts + self.timeouts) / attempts, 3) if attempts else None,
+                "wait_avg_ms": round(self.wait_total_ms / attempts, 2) if attempts else None,
+                "wait_max_ms": round(self.wait_max_ms, 2),
+                "peak_checked_out": self.peak_checked_out,
+                "wait_histogram_ms": histogram
+            }
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that times every checkout and counts checkouts that found the pool exhausted.
+
+    A checkout is saturated when no idle connection was available and the
+    overflow limit was reached, i.e. it had to wait for another request to
+    check a connection back in.
+    """
+
+    _timing = threading.local()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def recreate(self):
+        # engine.dispose() swaps in a fresh pool; keep the telemetry
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+    def _do_get(self):
+        # QueuePool._do_get retries by calling itself; only time the outer call
+        if getattr(self._timing, 'active', False):
+            return super()._do_get()
+        saturated = (
+            self._max_overflow > -1
+            and self._overflow >= self._max_overflow
+            and self.checkedin() == 0
+        )
+        started = time.perf_counter()
+        self._timing.active = True
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.record((time.perf_counter() - started) * 1000, saturated, self.checkedout(), timed_out=True)
+            raise
+        finally:
+            self._timing.active = False
+        self.stats.record((time.perf_counter() - started) * 1000, saturated, self.checkedout())
+        return connection
+
+def pool_status(engine):
+    """Pool configuration, current occupancy and checkout telemetry for /api/status."""
+    pool = engine.pool
+    status = {"class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            "pool_size": pool.size(),
+            "max_overflow": pool._max_overflow,
+            "timeout_seconds": pool.timeout(),
+            "checked_out": pool.checkedout(),
+            "idle": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0)
+        })
+    if isinstance(pool, InstrumentedQueuePool):
+        status.update(pool.stats.snapshot())
+    return status
@@ -0,0 +1,108 @@
+import calendar
+from datetime import date, datetime
+from sqlalchemy import extract, func
+from app.models import DailyReport, MonthlyRollup
+from app.aggregates import RangeScope, aggregate_range, count, total
+from app.upsert import upsert
+
+# Monthly rollups of DailyReport. Writers call refresh_for_dates() after
+# committing reports so the affected months are recomputed; range endpoints
+# read the rollups instead of daily rows when a range spans whole months.
+
+D = DailyReport
+R = MonthlyRollup
+
+_basket_day = D.avg_value_per_basket > 0
+_gp_day = D.stock_gross_profit_percent_today != 0
+
+# Rollup column -> aggregate over the month's daily reports
+ROLLUP_AGGREGATES = {
+    'report_count': count(),
+    'total_turnover': total(D.total_turnover_today),
+    'dispensary_turnover': total(D.dispensary_turnover_today),
+    'gross_profit': total(D.stock_gross_profit_today),
+    'cost_of_sales': total(D.cost_of_sales_today),
+    'purchases': total(D.stock_purchases_today),
+    'stock_adjustments': total(D.stock_adjustments_today),
+    'transactions': total(D.sales_total_trans_today),
+    'scripts_dispensed': total(D.scripts_dispensed_today),
+    'basket_value_sum': total(D.avg_value_per_basket, _basket_day),
+    'basket_items_sum': total(func.coalesce(D.avg_items_per_basket, 0), _basket_day),
+    'basket_days': count(_basket_day),
+    'gp_percent_sum': total(D.stock_gross_profit_percent_today, _gp_day),
+    'gp_percent_days': count(_gp_day),
+}
+
+def month_bounds(year, month):
+    """First and last ISO date of a month."""
+    last_day = calendar.monthrange(year, month)[1]
+    return date(year, month, 1).isoformat(), date(year, month, last_day).isoformat()
+
+def whole_months(start_date, end_date):
+    """Return ((start_year, start_month), (end_year, end_month)) if the range is whole months, else None."""
+    try:
+        start = datetime.strptime(str(start_date), '%Y-%m-%d').date()
+        end = datetime.strptime(str(end_date), '%Y-%m-%d').date()
+    except ValueError:
+        return None
+    if start.day != 1 or end.day != calendar.monthrange(end.year, end.month)[1] or start > end:
+        return None
+    return (start.year, start.month), (end.year, end.month)
+
+def period_filters(pharmacy, first_month, last_month):
+    """Filters selecting a pharmacy's rollup rows between two (year, month) keys inclusive."""
+    period = R.year * 100 + R.month
+    return (
+        R.pharmacy_code == pharmacy,
+        period >= first_month[0] * 100 + first_month[1],
+        period <= last_month[0] * 100 + last_month[1]
+    )
+
+def refresh_month(session, pharmacy, year, month):
+    """Recompute one month's rollup from its daily reports and return its values. The caller commits."""
+    values = aggregate_range(session, RangeScope(pharmacy, *month_bounds(year, month)), ROLLUP_AGGREGATES)
+    upsert(session, R, dict(values, pharmacy_code=pharmacy, year=year, month=month),
+           ['pharmacy_code', 'year', 'month'], values)
+    return values
+
+def refresh_for_dates(session, pharmacy, report_dates):
+    """Refresh and commit the rollups of every month touched by report_dates."""
+    months = sorted({(d.year, d.month) for d in report_dates})
+    for year, month in months:
+        refresh_month(session, pharmacy, year, month)
+    if months:
+        session.commit()
+    return len(months)
+
+def rebuild_rollups(session, pharmacy=None):
+    """Rebuild rollups from scratch with a single GROUP BY over the daily reports."""
+    year = extract('year', D.report_date)
+    month = extract('month', D.report_date)
+    labels = list(ROLLUP_AGGREGATES)
+    query = session.query(
+        D.pharmacy_code,
+        year.label('year'),
+        month.label('month'),
+        *[ROLLUP_AGGREGATES[label].label(label) for label in labels]
+    )
+    if pharmacy:
+        query = query.filter(D.pharmacy_code == pharmacy)
+    rows = query.group_by(D.pharmacy_code, year, month).all()
+
+    existing = session.query(R)
+    if pharmacy:
+        existing = existing.filter(R.pharmacy_code == pharmacy)
+    existing.delete(synchronize_session=False)
+    for row in rows:
+        rollup = R(pharmacy_code=row.pharmacy_code, year=int(row.year), month=int(row.month))
+        for label in labels:
+            setattr(rollup, label, getattr(row, label))
+        session.add(rollup)
+    session.commit()
+    return len(rows)
+
+def ensure_rollups(session):
+    """Build the rollups once if the table is empty but daily reports exist."""
+    if session.query(R.id).first() is None and session.query(D.id).first() is not None:
+        built = rebuild_rollups(session)
+        print(f"[Rollups] Built {built} monthly rollups from daily reports", flush=True)
@@ -0,0 +1,18 @@
+from sqlalchemy.dialects import postgresql, sqlite
+
+# INSERT ... ON CONFLICT DO UPDATE for the databases the app runs on
+# (PostgreSQL and SQLite). Rows written by several processes at once (web
+# workers, the ingestion writer) must not be created with a check-then-insert,
+# or the second writer fails on the unique constraint.
+
+def upsert(session, model, values, conflict_columns, update):
+    """Insert values as a row of model, or apply update to the existing row matching conflict_columns."""
+    if session.get_bind().dialect.name == 'postgresql':
+        insert = postgresql.insert
+    else:
+        insert = sqlite.insert
+    statement = insert(model.__table__).values(**values).on_conflict_do_update(
+        index_elements=conflict_columns,
+        set_=update
+    )
+    session.execute(statement)
@@ -5,7 +5,14 @@ import sys
 # Load environment variables from .env file
 load_dotenv()
 
-IMAP_SERVER = "imap.gmail.com" # Default IMAP server
+IMAP_SERVER = os.getenv("IMAP_SERVER", "imap.gmail.com") # Default IMAP server
+# Point these at a local IMAP stand-in (scripts/imap_standin.py) for testing,
+# e.g. IMAP_SERVER=localhost IMAP_PORT=1143 IMAP_SSL=false
+IMAP_PORT = int(os.getenv("IMAP_PORT", "993"))
+IMAP_SSL = os.getenv("IMAP_SSL", "true").lower() == "true"
+IMAP_TIMEOUT = int(os.getenv("IMAP_TIMEOUT", "30"))  # Seconds per IMAP socket operation
+# Download only each email's report part (via BODYSTRUCTURE) instead of the whole message
+IMAP_PARTIAL_FETCH = os.getenv("IMAP_PARTIAL_FETCH", "true").lower() == "true"
 
 # Define MAILBOXES structure by loading credentials from environment variables
 MAILBOXES = [
@@ -54,6 +61,68 @@ GMAIL_PASSWORD = os.getenv("FALLBACK_GMAIL_APP_PASSWORD")
 # Database URI: use DATABASE_URL from .env if set, otherwise default to SQLite
 DATABASE_URI = os.getenv("DATABASE_URL", "sqlite:///db/daily_reports.db")
 
+# Optional read replica used by the API's GET requests. Ingestion, scripts and
+# POSTs always use DATABASE_URL. For local testing, point it at a read-only
+# view of the same SQLite file (sqlite:///file:db/daily_reports.db?mode=ro&uri=true)
+# or at a copy made with scripts/refresh_local_replica.py.
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")
+
+# Connection pool for PostgreSQL (SQLite always uses a single shared connection).
+# Size it from the db_pool section of /api/status: saturated checkouts and
+# long waits mean requests are queueing for a connection.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "2"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "0"))  # Extra connections opened under load, closed when returned
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "20"))  # Seconds to wait for a connection before failing
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "300"))  # Seconds before a connection is replaced
+
+# Apply pending schema migrations (app/migrations.py) when app.db is first
+# imported. Turn off to run them only by hand with scripts/migrate.py.
+DB_AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "true").lower() == "true"
+
+# In-process response cache for the read-only dashboard endpoints
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))  # Max cached responses per worker
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "600"))  # Seconds before an entry is recomputed anyway
+
+# Per-endpoint latency / SQL instrumentation exported on /api/metrics
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+METRICS_WINDOW = int(os.getenv("METRICS_WINDOW", "1024"))  # Recent samples kept per endpoint for quantiles
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")  # /api/metrics is only served with a token ("Authorization: Bearer <token>")
+
+# Garbage collection for the API process. "adaptive" collects only when RSS
+# crosses GC_RSS_THRESHOLD_MB or every GC_REQUEST_INTERVAL requests; "always"
+# restores the old full collection after every request.
+GC_MODE = os.getenv("GC_MODE", "adaptive")
+GC_RSS_THRESHOLD_MB = float(os.getenv("GC_RSS_THRESHOLD_MB", "180"))
+GC_REQUEST_INTERVAL = int(os.getenv("GC_REQUEST_INTERVAL", "200"))
+GC_THRESHOLDS = os.getenv("GC_THRESHOLDS", "5000,20,20")  # gen0,gen1,gen2 passed to gc.set_threshold
+
+# Response compression (Brotli when the brotli package is installed, else gzip).
+# Responses smaller than COMPRESSION_MIN_SIZE bytes are sent as they are.
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_LEVEL = int(os.getenv("COMPRESSION_BROTLI_LEVEL", "4"))
+
+# In-process email ingestion (app.ingestion). Runs on a background thread when
+# INGEST_ENABLED is true (the default on Render); scripts/ingest_worker.py runs
+# the same scheduler as a dedicated process instead.
+INGEST_ENABLED = os.getenv("INGEST_ENABLED", os.getenv("RENDER", "false")).lower() == "true"
+INGEST_INTERVAL_SECONDS = int(os.getenv("INGEST_INTERVAL_SECONDS", "600"))
+INGEST_INITIAL_DELAY_SECONDS = int(os.getenv("INGEST_INITIAL_DELAY_SECONDS", "300"))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "5"))  # Mailboxes fetched at the same time; DB writes use one thread
+INGEST_DAYS = int(os.getenv("INGEST_DAYS", "7"))  # Days searched per cycle, or on first sync when incremental
+# Only fetch messages above each mailbox's stored UID watermark
+INGEST_INCREMENTAL = os.getenv("INGEST_INCREMENTAL", "true").lower() == "true"
+INGEST_MEMORY_LIMIT_MB = float(os.getenv("INGEST_MEMORY_LIMIT_MB", "200"))  # Skip a cycle above this RSS
+# Keep one IMAP connection per mailbox in IDLE and ingest new mail as soon as
+# the server announces it (requires INGEST_ENABLED or scripts/ingest_worker.py).
+# IDLE is re-issued every IMAP_IDLE_TIMEOUT seconds, well inside the 29 minutes
+# servers allow, and dropped connections are retried with exponential backoff.
+IMAP_IDLE_ENABLED = os.getenv("IMAP_IDLE_ENABLED", "false").lower() == "true"
+IMAP_IDLE_TIMEOUT = int(os.getenv("IMAP_IDLE_TIMEOUT", "540"))
+IMAP_RECONNECT_MAX_BACKOFF = int(os.getenv("IMAP_RECONNECT_MAX_BACKOFF", "300"))  # Seconds
+
 # Verify that critical environment variables are loaded for each mailbox
 missing_credentials = []
 for mailbox in MAILBOXES:
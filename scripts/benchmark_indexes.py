@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+import os
+import sys
+import argparse
+import random
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+
+# Add project root to Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+
+from sqlalchemy import create_engine, select, text
+from app.models import Base, DailyReport
+from app.aggregates import RangeScope, range_filters
+from app.migrations import run_migrations
+
+# Compares query plans and timings of the hot daily_reports lookups before and
+# after the app.migrations indexes, on a synthetic database. Uses a throwaway
+# SQLite file unless --database-url points at a scratch PostgreSQL database
+# (its daily_reports table is dropped and recreated).
+
+D = DailyReport
+PHARMACIES = ['reitz', 'roos', 'tugela', 'villiers', 'winterton']
+
+def hot_queries(scope):
+    """The statements behind closing stock, opening stock and missing turnover dates."""
+    return {
+        'latest closing stock': select(D.report_date, D.closing_stock_today)
+            .where(*range_filters(scope), D.closing_stock_today.isnot(None))
+            .order_by(D.report_date.desc()).limit(1),
+        'first positive opening stock': select(D.report_date, D.opening_stock_today)
+            .where(*range_filters(scope), D.opening_stock_today > 0)
+            .order_by(D.report_date.asc()).limit(1),
+        'dates with turnover': select(D.report_date)
+            .where(*range_filters(scope), D.total_turnover_today > 0),
+    }
+
+def populate(engine, days):
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    # Start from the pre-migration schema
+    for index in D.__table__.indexes:
+        index.drop(engine, checkfirst=True)
+    with engine.begin() as connection:
+        connection.execute(text("DELETE FROM schema_migrations"))
+
+    rng = random.Random(42)
+    first_day = date.today() - timedelta(days=days)
+    rows = []
+    for pharmacy in PHARMACIES:
+        for offset in range(days):
+            rows.append({
+                'pharmacy_code': pharmacy,
+                'report_date': first_day + timedelta(days=offset),
+                'total_turnover_today': 0 if rng.random() < 0.1 else rng.uniform(5000, 50000),
+                'opening_stock_today': 0 if rng.random() < 0.2 else rng.uniform(500000, 900000),
+                'closing_stock_today': None if rng.random() < 0.2 else rng.uniform(500000, 900000),
+                'cost_of_sales_today': rng.uniform(3000, 30000),
+            })
+    with engine.begin() as connection:
+        connection.execute(D.__table__.insert(), rows)
+    return first_day
+
+def explain(connection, statement):
+    compiled = statement.compile(dialect=connection.dialect)
+    sql = str(compiled)
+    params = compiled.construct_params()
+    if connection.dialect.name == 'sqlite':
+        positional = tuple(params[name] for name in compiled.positiontup)
+        return [str(row[-1]) for row in connection.exec_driver_sql("EXPLAIN QUERY PLAN " + sql, positional)]
+    return [row[0] for row in connection.execute(text("EXPLAIN " + sql), params)]
+
+def measure(engine, queries, repeat):
+    results = {}
+    with engine.connect() as connection:
+        for name, statement in queries.items():
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                connection.execute(statement).fetchall()
+                timings.append((time.perf_counter() - started) * 1000)
+            results[name] = (explain(connection, statement), statistics.median(timings))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark daily_reports lookups before and after the index migrations.")
+    parser.add_argument('--database-url', help='Scratch database to use (default: temporary SQLite file)')
+    parser.add_argument('--days', type=int, default=3 * 365, help='Days of reports per pharmacy (default: 1095)')
+    parser.add_argument('--repeat', type=int, default=200, help='Executions per query (default: 200)')
+    args = parser.parse_args()
+
+    tmp_path = None
+    database_url = args.database_url
+    if not database_url:
+        tmp_fd, tmp_path = tempfile.mkstemp(suffix='.db')
+        os.close(tmp_fd)
+        database_url = f"sqlite:///{tmp_path}"
+
+    engine = create_engine(database_url)
+    try:
+        first_day = populate(engine, args.days)
+        scope = RangeScope('reitz', (first_day + timedelta(days=args.days // 2)).isoformat(),
+                           (first_day + timedelta(days=args.days // 2 + 365)).isoformat())
+        queries = hot_queries(scope)
+        print(f"Database: {engine.url.get_backend_name()}, {len(PHARMACIES) * args.days} reports, "
+              f"range {scope.start_date}..{scope.end_date}\n")
+
+        before = measure(engine, queries, args.repeat)
+        run_migrations(engine)
+        after = measure(engine, queries, args.repeat)
+
+        for name in queries:
+            plan_before, ms_before = before[name]
+            plan_after, ms_after = after[name]
+            print(f"== {name}: {ms_before:.3f} ms -> {ms_after:.3f} ms (median of {args.repeat})")
+            print("   before:")
+            for line in plan_before:
+                print(f"     {line}")
+            print("   after:")
+            for line in plan_after:
+                print(f"     {line}")
+            print()
+    finally:
+        engine.dispose()
+        if tmp_path:
+            os.remove(tmp_path)
+
+if __name__ == "__main__":
+    main()
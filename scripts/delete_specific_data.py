@@ -6,8 +6,10 @@ from datetime import datetime
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(project_root)
 
-from app.db import create_session, cleanup_db_sessions
+from app.db import create_session
 from app.models import DailyReport
+from app.rollups import refresh_for_dates
+from app.data_version import bump_data_version
 
 # --- Configuration ---
 PHARMACY_CODE_TO_DELETE = "reitz"
@@ -57,6 +59,8 @@ def delete_data_for_date():
             session.delete(record)
         
         session.commit()
+        refresh_for_dates(session, PHARMACY_CODE_TO_DELETE, [date_to_delete])
+        bump_data_version(session, PHARMACY_CODE_TO_DELETE)
         print("Records successfully deleted and transaction committed.")
 
     except Exception as e:
@@ -67,7 +71,7 @@ def delete_data_for_date():
     finally:
         if session:
             print("Closing database session.")
-            cleanup_db_sessions()
+            session.close()
 
 if __name__ == "__main__":
     print("--- WARNING: This script will permanently delete data from the database. ---")
@@ -7,6 +7,8 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from app.db import create_session
 from app.models import DailyReport
+from app.rollups import rebuild_rollups
+from app.data_version import bump_data_version
 
 def copy_pharmacy_data(session, source_code, dest_code):
     """
@@ -74,6 +76,12 @@ if __name__ == "__main__":
         
         print("Committing changes to the database...")
         session.commit()
+
+        # The destinations' reports were replaced wholesale, so rebuild their
+        # rollups (dropping months only the old data had) and invalidate caches
+        for dest_code in pharmacies_to_copy:
+            rebuild_rollups(session, dest_code)
+            bump_data_version(session, dest_code)
         print("Dummy data generation successful!")
         
     except Exception as e:
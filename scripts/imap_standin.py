@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+import os
+import argparse
+import datetime
+import email
+import email.utils
+import re
+import select
+import shlex
+import socketserver
+import threading
+import time
+from email.message import EmailMessage
+
+# A small local IMAP server for exercising the email ingestion without Gmail.
+# It implements the subset of IMAP4rev1 the fetcher uses (including ENVELOPE,
+# BODYSTRUCTURE and BODY[<section>] fetches, and IDLE), serving each login's
+# messages from <root>/<username>/*.eml (any password is accepted). Files
+# added while it runs are picked up on the next command.
+#
+#   python scripts/imap_standin.py seed --root /tmp/imap --user reitz@example.com --days 3
+#   python scripts/imap_standin.py serve --root /tmp/imap --port 1143
+#
+# then run the fetcher with IMAP_SERVER=localhost IMAP_PORT=1143 IMAP_SSL=false
+# and the mailbox credentials set to the seeded username.
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+SAMPLE_REPORT = os.path.join(project_root, 'MANAGE.htm')
+
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+class Mailstore:
+    """Messages per user, numbered with UIDs that stay stable while the server runs."""
+
+    def __init__(self, root, uidvalidity):
+        self.root = root
+        self.uidvalidity = uidvalidity
+        self._uids = {}
+        self._lock = threading.Lock()
+
+    def messages(self, user):
+        """[(uid, path)] of user's messages in UID order; new files get the next UIDs."""
+        directory = os.path.join(self.root, user)
+        names = sorted(n for n in os.listdir(directory) if n.endswith('.eml')) if os.path.isdir(directory) else []
+        with self._lock:
+            uids = self._uids.setdefault(user, {})
+            for name in names:
+                if name not in uids:
+                    uids[name] = max(uids.values(), default=0) + 1
+            return sorted((uids[name], os.path.join(directory, name)) for name in names)
+
+def _parse_imap_date(value):
+    day, month, year = value.split('-')
+    return datetime.date(int(year), MONTHS.index(month.title()) + 1, int(day))
+
+def _message_date(data):
+    try:
+        return email.utils.parsedate_to_datetime(email.message_from_bytes(data)['Date']).date()
+    except Exception:
+        return None
+
+def _in_set(number, sequence_set, largest):
+    """Whether number is in an IMAP sequence set such as '1:3,7,9:*'."""
+    for part in sequence_set.split(','):
+        if ':' in part:
+            low, high = part.split(':')
+            low = largest if low == '*' else int(low)
+            high = largest if high == '*' else int(high)
+            if min(low, high) <= number <= max(low, high):
+                return True
+        elif number == (largest if part == '*' else int(part)):
+            return True
+    return False
+
+def _quote(value):
+    if value is None:
+        return 'NIL'
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+def _param_list(pairs):
+    pairs = [(k, v) for k, v in pairs if v is not None]
+    if not pairs:
+        return 'NIL'
+    return '(' + ' '.join(f'{_quote(k)} {_quote(v)}' for k, v in pairs) + ')'
+
+def _addresses(msg, header, fallback=None):
+    values = msg.get_all(header) or (msg.get_all(fallback) if fallback else None)
+    if not values:
+        return 'NIL'
+    entries = []
+    for name, address in email.utils.getaddresses(values):
+        mailbox, _, host = address.partition('@')
+        entries.append(f'({_quote(name or None)} NIL {_quote(mailbox)} {_quote(host or None)})')
+    return '(' + ''.join(entries) + ')'
+
+def _envelope(msg):
+    """The IMAP ENVELOPE of a message, with raw (still encoded) header values."""
+    return '(' + ' '.join([
+        _quote(msg['Date']), _quote(msg['Subject']),
+        _addresses(msg, 'From'), _addresses(msg, 'Sender', 'From'), _addresses(msg, 'Reply-To', 'From'),
+        _addresses(msg, 'To'), _addresses(msg, 'Cc'), _addresses(msg, 'Bcc'),
+        _quote(msg['In-Reply-To']), _quote(msg['Message-ID'])
+    ]) + ')'
+
+def _raw_payload(part):
+    """A part's body as sent, still in its Content-Transfer-Encoding."""
+    payload = part.get_payload()
+    return payload.encode('utf-8', 'surrogateescape') if isinstance(payload, str) else b''
+
+def _disposition(part):
+    value = part.get('Content-Disposition')
+    if value is None:
+        return 'NIL'
+    params = part.get_params(header='content-disposition') or []
+    return f'({_quote(params[0][0] if params else str(value).split(";")[0].strip())} {_param_list(params[1:])})'
+
+def _bodystructure(part):
+    """The IMAP BODYSTRUCTURE (with extension data) of a message or part."""
+    if part.get_content_type() == 'message/rfc822':
+        inner = part.get_payload(0)
+        raw = inner.as_bytes()
+        lines = raw.count(b'\n')
+        return (f'("message" "rfc822" {_param_list(part.get_params()[1:])} NIL NIL '
+                f'{_quote(part.get("Content-Transfer-Encoding", "7bit"))} {len(raw)} '
+                f'{_envelope(inner)} {_bodystructure(inner)} {lines} NIL {_disposition(part)} NIL NIL)')
+    if part.is_multipart():
+        children = ''.join(_bodystructure(child) for child in part.get_payload())
+        return (f'({children} {_quote(part.get_content_subtype())} {_param_list(part.get_params()[1:])} '
+                f'{_disposition(part)} NIL NIL)')
+    raw = _raw_payload(part)
+    fields = [
+        _quote(part.get_content_maintype()), _quote(part.get_content_subtype()),
+        _param_list(part.get_params()[1:] if part.get('Content-Type') else [('charset', 'us-ascii')]),
+        _quote(part['Content-ID']), _quote(part['Content-Description']),
+        _quote(part.get('Content-Transfer-Encoding', '7bit')), str(len(raw))
+    ]
+    if part.get_content_maintype() == 'text':
+        fields.append(str(raw.count(b'\n')))
+    fields += ['NIL', _disposition(part), 'NIL', 'NIL']
+    return '(' + ' '.join(fields) + ')'
+
+def _section(msg, section):
+    """The encoded body of a numbered section such as '2' or '1.2'."""
+    part = msg
+    for number in section.split('.'):
+        if part.get_content_type() == 'message/rfc822':
+            part = part.get_payload(0)
+        if part.is_multipart():
+            part = part.get_payload()[int(number) - 1]
+        elif number != '1':
+            raise ValueError(f'no section {section}')
+    return _raw_payload(part)
+
+class IMAPHandler(socketserver.StreamRequestHandler):
+    def send(self, line):
+        if isinstance(line, str):
+            line = line.encode('utf-8')
+        self.wfile.write(line + b'\r\n')
+        self.wfile.flush()
+
+    def handle(self):
+        self.user = None
+        self.selected = False
+        self.send('* OK IMAP4rev1 stand-in ready')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            line = line.decode('utf-8', 'replace').rstrip('\r\n')
+            if not line:
+                continue
+            tag, _, rest = line.partition(' ')
+            command, _, arguments = rest.partition(' ')
+            if self.server.delay:
+                # Simulated network round trip
+                time.sleep(self.server.delay)
+            handler = getattr(self, 'cmd_' + command.lower(), None)
+            if handler is None:
+                self.send(f'{tag} BAD unknown command {command}')
+                continue
+            try:
+                if handler(tag, arguments) is False:
+                    return
+            except Exception as e:
+                self.send(f'{tag} BAD {e}')
+
+    # --- commands -------------------------------------------------------
+
+    def cmd_capability(self, tag, arguments):
+        self.send('* CAPABILITY IMAP4rev1 IDLE')
+        self.send(f'{tag} OK CAPABILITY completed')
+
+    def cmd_noop(self, tag, arguments):
+        self.send(f'{tag} OK NOOP completed')
+
+    def cmd_login(self, tag, arguments):
+        self.user = shlex.split(arguments)[0]
+        self.send(f'{tag} OK LOGIN completed')
+
+    def cmd_select(self, tag, arguments):
+        if self.user is None:
+            self.send(f'{tag} NO not authenticated')
+            return
+        messages = self.server.store.messages(self.user)
+        self.selected = True
+        self.send(f'* {len(messages)} EXISTS')
+        self.send('* 0 RECENT')
+        self.send(f'* OK [UIDVALIDITY {self.server.store.uidvalidity}] UIDs valid')
+        self.send(f'* OK [UIDNEXT {(messages[-1][0] if messages else 0) + 1}] Predicted next UID')
+        self.send(f'{tag} OK [READ-WRITE] SELECT completed')
+
+    cmd_examine = cmd_select
+
+    def cmd_close(self, tag, arguments):
+        self.selected = False
+        self.send(f'{tag} OK CLOSE completed')
+
+    def cmd_logout(self, tag, arguments):
+        self.send('* BYE logging out')
+        self.send(f'{tag} OK LOGOUT completed')
+        return False
+
+    def cmd_search(self, tag, arguments, by_uid=False):
+        messages = self.server.store.messages(self.user)
+        tokens = arguments.replace('(', ' ').replace(')', ' ').replace('"', ' ').split()
+        upper = [t.upper() for t in tokens]
+        since = _parse_imap_date(tokens[upper.index('SINCE') + 1]) if 'SINCE' in upper else None
+        uid_set = tokens[upper.index('UID') + 1] if 'UID' in upper else None
+        largest_uid = messages[-1][0] if messages else 0
+        found = []
+        for number, (uid, path) in enumerate(messages, start=1):
+            if uid_set is not None and not _in_set(uid, uid_set, largest_uid):
+                continue
+            if since is not None:
+                with open(path, 'rb') as f:
+                    sent = _message_date(f.read())
+                if sent is None or sent < since:
+                    continue
+            found.append(str(uid if by_uid else number))
+        self.send('* SEARCH' + (' ' + ' '.join(found) if found else ''))
+        self.send(f'{tag} OK SEARCH completed')
+
+    def cmd_fetch(self, tag, arguments, by_uid=False):
+        sequence_set, _, items = arguments.partition(' ')
+        upper = items.upper()
+        sections = re.findall(r'BODY(?:\.PEEK)?\[([0-9.]+)\]', upper)
+        messages = self.server.store.messages(self.user)
+        largest = (messages[-1][0] if messages else 0) if by_uid else len(messages)
+        for number, (uid, path) in enumerate(messages, start=1):
+            if not _in_set(uid if by_uid else number, sequence_set, largest):
+                continue
+            with open(path, 'rb') as f:
+                data = f.read()
+            msg = email.message_from_bytes(data)
+            response = f'* {number} FETCH (UID {uid}'.encode('ascii')
+            if 'ENVELOPE' in upper:
+                response += b' ENVELOPE ' + _envelope(msg).encode('utf-8')
+            if 'BODYSTRUCTURE' in upper:
+                response += b' BODYSTRUCTURE ' + _bodystructure(msg).encode('utf-8')
+            for section in sections:
+                body = _section(msg, section)
+                response += f' BODY[{section}] {{{len(body)}}}\r\n'.encode('ascii') + body
+            if re.search(r'RFC822(?!\.)|BODY(\.PEEK)?\[\]', upper):
+                response += f' RFC822 {{{len(data)}}}\r\n'.encode('ascii') + data
+            self.wfile.write(response + b')\r\n')
+        self.wfile.flush()
+        self.send(f'{tag} OK FETCH completed')
+
+    def cmd_idle(self, tag, arguments):
+        """Report new messages with EXISTS until the client sends DONE."""
+        if not self.selected:
+            self.send(f'{tag} BAD no mailbox selected')
+            return
+        known = len(self.server.store.messages(self.user))
+        self.send('+ idling')
+        while True:
+            readable, _, _ = select.select([self.connection], [], [], 0.5)
+            if readable:
+                line = self.rfile.readline()
+                if not line:
+                    return False
+                if line.strip().upper() == b'DONE':
+                    self.send(f'{tag} OK IDLE terminated')
+                    return
+                self.send(f'{tag} BAD expected DONE')
+                return
+            count = len(self.server.store.messages(self.user))
+            if count != known:
+                known = count
+                self.send(f'* {count} EXISTS')
+
+    def cmd_uid(self, tag, arguments):
+        command, _, rest = arguments.partition(' ')
+        if command.upper() == 'SEARCH':
+            return self.cmd_search(tag, rest, by_uid=True)
+        if command.upper() == 'FETCH':
+            return self.cmd_fetch(tag, rest, by_uid=True)
+        self.send(f'{tag} BAD unsupported UID command {command}')
+
+class IMAPStandIn(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, store, delay=0.0):
+        super().__init__(address, IMAPHandler)
+        self.store = store
+        self.delay = delay
+
+def report_message(user, report_date, subject=None, html=None):
+    """A daily report email as the pharmacy system sends it: HTML body plus .htm attachment."""
+    if html is None:
+        with open(SAMPLE_REPORT, 'rb') as f:
+            html = f.read()
+    message = EmailMessage()
+    message['From'] = 'reports@example.com'
+    message['To'] = user
+    message['Subject'] = subject or f"Daily Management Report {report_date.isoformat()}"
+    sent = datetime.datetime.combine(report_date, datetime.time(18, 45), tzinfo=datetime.timezone.utc)
+    message['Date'] = email.utils.format_datetime(sent)
+    message.set_content("The daily management report is attached.")
+    message.add_attachment(html, maintype='text', subtype='html', filename='MANAGE.htm')
+    return message.as_bytes()
+
+def seed(root, user, days, forwarded=False):
+    directory = os.path.join(root, user)
+    os.makedirs(directory, exist_ok=True)
+    today = datetime.date.today()
+    written = []
+    for offset in range(days, 0, -1):
+        report_date = today - datetime.timedelta(days=offset)
+        path = os.path.join(directory, f"{report_date.strftime('%Y%m%d')}.eml")
+        with open(path, 'wb') as f:
+            f.write(report_message(user, report_date))
+        written.append(path)
+    if forwarded:
+        report_date = today - datetime.timedelta(days=1)
+        path = os.path.join(directory, f"{report_date.strftime('%Y%m%d')}_fwd.eml")
+        with open(path, 'wb') as f:
+            f.write(report_message(user, report_date, subject=f"Fwd: Daily Management Report {report_date.isoformat()}"))
+        written.append(path)
+    return written
+
+def main():
+    parser = argparse.ArgumentParser(description="Local IMAP stand-in for testing email ingestion.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve_parser = commands.add_parser('serve', help='Serve <root>/<user>/*.eml over plain IMAP')
+    serve_parser.add_argument('--root', required=True)
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=1143)
+    serve_parser.add_argument('--uidvalidity', type=int, default=1)
+    serve_parser.add_argument('--delay', type=float, default=0.0, help='Seconds to wait before answering each command')
+    seed_parser = commands.add_parser('seed', help="Write sample report emails for a user")
+    seed_parser.add_argument('--root', required=True)
+    seed_parser.add_argument('--user', required=True)
+    seed_parser.add_argument('--days', type=int, default=7, help='One report per day for the last N days')
+    seed_parser.add_argument('--forwarded', action='store_true', help="Also add a 'Fwd:' copy of yesterday's report")
+    args = parser.parse_args()
+
+    if args.command == 'seed':
+        for path in seed(args.root, args.user, args.days, args.forwarded):
+            print(f"[IMAP stand-in] Wrote {path}", flush=True)
+        return
+
+    server = IMAPStandIn((args.host, args.port), Mailstore(args.root, args.uidvalidity), args.delay)
+    print(f"[IMAP stand-in] Serving {args.root} on {args.host}:{args.port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+import os
+import sys
+import argparse
+import time
+
+# Add project root to Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+
+from app.ingestion import IngestionScheduler, start_idle_watchers
+from config import settings
+
+# Dedicated ingestion process: runs the scheduler from app/ingestion.py in the
+# foreground. Use it instead of the in-process scheduler (leave INGEST_ENABLED
+# unset for the web service) when ingestion should not share the web process.
+
+def main():
+    parser = argparse.ArgumentParser(description="Run email ingestion on a schedule.")
+    parser.add_argument('--interval', type=int, default=settings.INGEST_INTERVAL_SECONDS,
+                        help=f'Seconds between cycles (default: {settings.INGEST_INTERVAL_SECONDS})')
+    parser.add_argument('--workers', type=int, default=settings.INGEST_WORKERS,
+                        help=f'Mailboxes fetched at the same time (default: {settings.INGEST_WORKERS})')
+    parser.add_argument('--once', action='store_true', help='Run a single cycle and exit')
+    parser.add_argument('--idle', action='store_true', default=settings.IMAP_IDLE_ENABLED,
+                        help='Also watch each mailbox with IMAP IDLE and ingest new mail immediately '
+                             f'(default: {settings.IMAP_IDLE_ENABLED})')
+    args = parser.parse_args()
+
+    scheduler = IngestionScheduler(
+        interval=args.interval,
+        initial_delay=0,
+        workers=args.workers,
+        days=settings.INGEST_DAYS,
+        incremental=settings.INGEST_INCREMENTAL,
+        memory_limit_mb=settings.INGEST_MEMORY_LIMIT_MB
+    )
+    if args.once:
+        scheduler.run_once()
+        return
+
+    print(f"[Ingest] Worker started: every {args.interval}s with {args.workers} worker(s)", flush=True)
+    scheduler.start()
+    if args.idle:
+        watchers = start_idle_watchers()
+        print(f"[Ingest] IMAP IDLE watchers started for {len(watchers)} mailbox(es)", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print("[Ingest] Worker stopped", flush=True)
+
+if __name__ == "__main__":
+    main()
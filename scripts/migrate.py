@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+import os
+import sys
+import argparse
+
+# Add project root to Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+
+from sqlalchemy import create_engine
+from app.migrations import pending_migrations, run_migrations
+from config import settings
+
+# Uses its own engine rather than app.db's: importing app.db applies pending
+# migrations itself (unless DB_AUTO_MIGRATE=false).
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply pending schema migrations from app/migrations.py.")
+    parser.add_argument('--list', action='store_true', help='Only list pending migrations')
+    args = parser.parse_args()
+
+    print(f"Database: {settings.DATABASE_URI}")
+    engine = create_engine(settings.DATABASE_URI)
+    pending = pending_migrations(engine)
+    if args.list or not pending:
+        if not pending:
+            print("No pending migrations.")
+        for version, description, _ in pending:
+            print(f"  {version}: {description}")
+        return
+
+    try:
+        applied = run_migrations(engine)
+        print(f"Applied {len(applied)} migration(s).")
+    except Exception as e:
+        print(f"[ERROR] Migration failed: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+import os
+import sys
+import argparse
+import gzip
+
+try:
+    import brotli
+except ImportError:  # optional: only .gz copies are written
+    brotli = None
+
+# Writes .gz (and, with the brotli package installed, .br) copies next to the
+# text assets of the built React bundle, at maximum compression. The dashboard
+# serves them to clients that accept the encoding (see app.compression), so
+# the files are compressed once at build time instead of on every request.
+# Run after `npm run build`.
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+
+EXTENSIONS = ('.html', '.js', '.mjs', '.css', '.json', '.svg', '.txt', '.xml', '.map', '.ico')
+
+def precompress(path, min_size):
+    """Write the compressed copies of one file. Returns [(suffix, size)] of the copies written."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < min_size:
+        return []
+    variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(data, quality=11)))
+
+    written = []
+    for suffix, compressed in variants:
+        target = path + suffix
+        if len(compressed) >= len(data):
+            # Not worth serving; drop any stale copy from an earlier build
+            if os.path.exists(target):
+                os.remove(target)
+            continue
+        with open(target, 'wb') as f:
+            f.write(compressed)
+        written.append((suffix, len(compressed)))
+    return written
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-compress the built static assets.")
+    parser.add_argument('directory', nargs='?', default=os.path.join(project_root, 'dist'),
+                        help='Build output directory (default: dist)')
+    parser.add_argument('--min-size', type=int, default=1024, help='Skip files smaller than this many bytes (default: 1024)')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.directory):
+        print(f"[Precompress] {args.directory} does not exist; run `npm run build` first", flush=True)
+        sys.exit(1)
+    if brotli is None:
+        print("[Precompress] brotli is not installed, writing .gz copies only", flush=True)
+
+    original_total = 0
+    compressed_total = 0
+    files = 0
+    for root, _, names in os.walk(args.directory):
+        for name in sorted(names):
+            if not name.endswith(EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            written = precompress(path, args.min_size)
+            if not written:
+                continue
+            size = os.path.getsize(path)
+            files += 1
+            original_total += size
+            compressed_total += min(compressed for _, compressed in written)
+            sizes = ', '.join(f"{suffix} {compressed / 1024:.1f} KB" for suffix, compressed in written)
+            print(f"[Precompress] {os.path.relpath(path, args.directory)}: {size / 1024:.1f} KB -> {sizes}", flush=True)
+
+    print(f"[Precompress] {files} files, {original_total / 1024:.1f} KB -> {compressed_total / 1024:.1f} KB", flush=True)
+
+if __name__ == "__main__":
+    main()
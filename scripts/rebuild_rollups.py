@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+import os
+import sys
+import argparse
+
+# Add project root to Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+
+from app.db import create_session
+from app.rollups import rebuild_rollups
+from config import settings
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the monthly rollups from the daily reports.")
+    parser.add_argument('--pharmacy', help='Only rebuild this pharmacy code (e.g., winterton)')
+    args = parser.parse_args()
+
+    session = create_session()
+    print(f"Database: {settings.DATABASE_URI}")
+    try:
+        built = rebuild_rollups(session, args.pharmacy)
+        print(f"Rebuilt {built} monthly rollup(s){' for ' + args.pharmacy if args.pharmacy else ''}.")
+    except Exception as e:
+        session.rollback()
+        print(f"[ERROR] Could not rebuild monthly rollups: {e}")
+        sys.exit(1)
+    finally:
+        session.close()
+
+if __name__ == "__main__":
+    main()
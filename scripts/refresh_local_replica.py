@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+import os
+import sys
+import sqlite3
+
+# Add project root to Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+
+from sqlalchemy.engine.url import make_url
+from config import settings
+
+# Local stand-in for replication: copies the primary SQLite database
+# (DATABASE_URL) over the replica file (DATABASE_READ_URL). Between runs the
+# replica lags the primary, as a real read replica can.
+
+def sqlite_path(url):
+    url = make_url(url)
+    if url.get_backend_name() != 'sqlite' or not url.database:
+        return None
+    path = url.database
+    return path[len('file:'):] if path.startswith('file:') else path
+
+def main():
+    primary = sqlite_path(settings.DATABASE_URI)
+    replica = sqlite_path(settings.DATABASE_READ_URL) if settings.DATABASE_READ_URL else None
+    if not primary or not replica:
+        print("[ERROR] DATABASE_URL and DATABASE_READ_URL must both be SQLite file URLs.")
+        sys.exit(1)
+    if os.path.abspath(primary) == os.path.abspath(replica):
+        print("Replica points at the primary file; nothing to copy.")
+        return
+
+    source = sqlite3.connect(primary)
+    target = sqlite3.connect(replica)
+    try:
+        source.backup(target)
+        print(f"Copied {primary} -> {replica}")
+    finally:
+        target.close()
+        source.close()
+
+if __name__ == "__main__":
+    main()
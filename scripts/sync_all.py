@@ -2,7 +2,6 @@
 import os
 import sys
 import datetime
-import shutil
 import argparse
 
 # Add project root to Python path
@@ -14,10 +13,10 @@ from app.db import create_session
 from app.models import DailyReport
 from app.parser import parse_html_daily
 from app.email_fetcher import sync_all_emails # Uses a large day count (3650) by default
+from app.rollups import refresh_for_dates
+from app.data_version import bump_data_version
 from config import settings
 
-TEMP_HTML_DIR = "/tmp/daily_html/"
-
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--pharmacy', help='Pharmacy code to sync (e.g., winterton)')
@@ -36,13 +35,16 @@ def main():
         print(f"Attempting to sync ALL emails for: {pharmacy_name} ({pharmacy_config.get('username')})")
         
         processed_files_count = 0
+        saved_dates = []
         try:
             # sync_all_emails internally calls fetch_emails_last_n_days with a large 'days' value
-            for filepath, report_date_obj in sync_all_emails(pharmacy_config):
-                if filepath:
-                    print(f"Parsing report: {filepath} for date: {report_date_obj.strftime('%Y-%m-%d')}")
+            for report, report_date_obj, subject in sync_all_emails(pharmacy_config):
+                if "fwd:" in subject.lower():
+                    print(f"Skipping forwarded email: {subject}")
+                elif report:
+                    print(f"Parsing report '{subject}' for date: {report_date_obj.strftime('%Y-%m-%d')}")
                     try:
-                        data = parse_html_daily(filepath)
+                        data = parse_html_daily(report)
                         data['pharmacy_code'] = pharmacy_config["code"]
                         data['report_date'] = report_date_obj
 
@@ -57,34 +59,26 @@ def main():
                         session.commit()
                         print(f"[SUCCESS] Report data saved to database for {pharmacy_config['code']} - {report_date_obj.strftime('%Y-%m-%d')}")
                         processed_files_count += 1
+                        saved_dates.append(report_date_obj)
                     except Exception as e:
                         session.rollback()
-                        print(f"[ERROR] Failed to parse or save report {filepath}: {e}")
-                    finally:
-                        if os.path.exists(filepath):
-                            try:
-                                os.remove(filepath)
-                                print(f"Removed temporary file: {filepath}")
-                            except OSError as e_rm:
-                                print(f"[ERROR] Could not remove temp file {filepath}: {e_rm}")
+                        print(f"[ERROR] Failed to parse or save report '{subject}' for {report_date_obj}: {e}")
                 else:
-                    print(f"[WARN] sync_all_emails yielded None filepath for {report_date_obj}")
+                    print(f"[WARN] sync_all_emails yielded no report for {report_date_obj}")
             
             if processed_files_count == 0:
                 print(f"No new email reports found or processed during full sync for {pharmacy_name}.")
 
+            refreshed = refresh_for_dates(session, pharmacy_config["code"], saved_dates)
+            if refreshed:
+                bump_data_version(session, pharmacy_config["code"])
+            print(f"Refreshed {refreshed} monthly rollup(s) for {pharmacy_name}.")
+
         except Exception as e_fetch:
             print(f"[ERROR] Could not sync emails for {pharmacy_name}: {e_fetch}")
         
         print(f"Finished syncing all emails for {pharmacy_name}.")
 
-    if os.path.exists(TEMP_HTML_DIR) and not os.listdir(TEMP_HTML_DIR):
-        try:
-            shutil.rmtree(TEMP_HTML_DIR)
-            print(f"Cleaned up empty temporary directory: {TEMP_HTML_DIR}")
-        except OSError as e_rmdir:
-            print(f"[ERROR] Could not remove temp directory {TEMP_HTML_DIR}: {e_rmdir}")
-
     session.close()
 
 if __name__ == "__main__":
@@ -1,6 +1,6 @@
 import { useState, useEffect } from 'react'
 import { useAuth } from '../contexts/AuthContext'
-import { turnoverAPI, financialAPI, stockAPI, salesAPI } from '../services/api'
+import { stockAPI, metricsAPI } from '../services/api'
 
 export const useDashboardData = () => {
   const { selectedPharmacy } = useAuth()
@@ -19,38 +19,31 @@ export const useDashboardData = () => {
       const endDate = dateRange?.endDate || new Date().toISOString().split('T')[0]
       const startDate = dateRange?.startDate || endDate
 
-      const [
-        turnoverData,
-        dailyTurnoverData,
-        gpData,
-        transactionsData,
-        openingStockData,
-        closingStockData,
-        cashSalesData,
-        accountSalesData,
-        codSalesData
-      ] = await Promise.all([
-        turnoverAPI.getTurnoverForRange(selectedPharmacy, startDate, endDate),
-        turnoverAPI.getDailyTurnoverForRange(selectedPharmacy, startDate, endDate),
-        financialAPI.getGPForRange(selectedPharmacy, startDate, endDate),
-        financialAPI.getTransactionsForRange(selectedPharmacy, startDate, endDate),
-        stockAPI.getOpeningStockForRange(selectedPharmacy, startDate, endDate),
-        stockAPI.getClosingStockForRange(selectedPharmacy, startDate, endDate),
-        salesAPI.getDailyCashSalesForRange(selectedPharmacy, startDate, endDate),
-        salesAPI.getDailyAccountSalesForRange(selectedPharmacy, startDate, endDate),
-        salesAPI.getDailyCODSalesForRange(selectedPharmacy, startDate, endDate)
+      const [metricsData, openingStockData] = await Promise.all([
+        metricsAPI.getMetricsForRange(selectedPharmacy, startDate, endDate, [
+          'turnover',
+          'daily_turnover',
+          'gp',
+          'transactions',
+          'closing_stock',
+          'daily_cash_sales',
+          'daily_account_sales',
+          'daily_cod_sales'
+        ]),
+        stockAPI.getOpeningStockForRange(selectedPharmacy, startDate, endDate)
       ])
+      const { metrics } = metricsData
 
       setData({
-        turnover: turnoverData,
-        dailyTurnover: dailyTurnoverData,
-        grossProfit: gpData,
-        transactions: transactionsData,
+        turnover: metrics.turnover,
+        dailyTurnover: metrics.daily_turnover,
+        grossProfit: metrics.gp,
+        transactions: metrics.transactions,
         openingStock: openingStockData,
-        closingStock: closingStockData,
-        cashSales: cashSalesData,
-        accountSales: accountSalesData,
-        codSales: codSalesData
+        closingStock: metrics.closing_stock,
+        cashSales: metrics.daily_cash_sales,
+        accountSales: metrics.daily_account_sales,
+        codSales: metrics.daily_cod_sales
       })
     } catch (err) {
       console.error('Error fetching dashboard data:', err)
@@ -96,22 +89,21 @@ export const useStockData = () => {
         openingStock,
         closingStock,
         adjustments,
-        turnoverRatio,
-        daysOfInventory
+        inventoryKpis
       ] = await Promise.all([
         stockAPI.getOpeningStockForRange(selectedPharmacy, startDate, endDate),
         stockAPI.getClosingStockForRange(selectedPharmacy, startDate, endDate),
         stockAPI.getStockAdjustmentsForRange(selectedPharmacy, startDate, endDate),
-        stockAPI.getTurnoverRatioForRange(selectedPharmacy, startDate, endDate),
-        stockAPI.getDaysOfInventoryForRange(selectedPharmacy, startDate, endDate)
+        stockAPI.getInventoryKpisForRange(selectedPharmacy, startDate, endDate)
       ])
 
+      // The KPI payload carries both the turnover ratio and days of inventory fields
       setStockData({
         openingStock,
         closingStock,
         adjustments,
-        turnoverRatio,
-        daysOfInventory
+        turnoverRatio: inventoryKpis,
+        daysOfInventory: inventoryKpis
       })
     } catch (err) {
       console.error('Error fetching stock data:', err)
@@ -1,7 +1,7 @@
 import { useState, useEffect, useRef } from 'react'
 import { TrendingUp, DollarSign, ShoppingCart, ShoppingBasket, Users, AlertCircle, TrendingDown, AlertTriangle, CheckCircle } from 'lucide-react'
 import { useAuth } from '../contexts/AuthContext'
-import { turnoverAPI, financialAPI, salesAPI } from '../services/api'
+import { turnoverAPI, financialAPI, salesAPI, metricsAPI } from '../services/api'
 import { Doughnut, Line, Bar } from 'react-chartjs-2'
 import { Chart as ChartJS, ArcElement, Tooltip, Legend, CategoryScale, LinearScale, PointElement, LineElement, Title, BarElement, Filler } from 'chart.js'
 import { Area, AreaChart, ResponsiveContainer } from 'recharts'
@@ -320,37 +320,41 @@ const Daily = ({ selectedDate }) => {
       const previousYearDate = getPreviousYearSameDayOfWeek(dateObj)
       const previousYearDateStr = formatDateLocal(previousYearDate)
       
-      const [
-        turnoverData,
-        gpData,
-        transactionsData,
-        avgBasketData,
-        avgBasketSizeData,
-        cashSalesData,
-        accountSalesData,
-        codSalesData,
-        previousYearTurnoverData,
-        cashTendersData,
-        creditCardTendersData,
-        scriptsDispensedData,
-        dispensaryPercentData,
-        dispensaryTurnoverData
-      ] = await Promise.all([
-        turnoverAPI.getTurnoverForRange(selectedPharmacy, date, date),
-        financialAPI.getGPForRange(selectedPharmacy, date, date),
-        financialAPI.getTransactionsForRange(selectedPharmacy, date, date),
-        financialAPI.getAvgBasketForRange(selectedPharmacy, date, date),
-        financialAPI.getDailyAvgBasketForRange(selectedPharmacy, date, date),
-        salesAPI.getDailyCashSalesForRange(selectedPharmacy, date, date),
-        salesAPI.getDailyAccountSalesForRange(selectedPharmacy, date, date),
-        salesAPI.getDailyCODSalesForRange(selectedPharmacy, date, date),
-        turnoverAPI.getTurnoverForRange(selectedPharmacy, previousYearDateStr, previousYearDateStr),
-        salesAPI.getDailyCashTendersForRange(selectedPharmacy, date, date),
-        salesAPI.getDailyCreditCardTendersForRange(selectedPharmacy, date, date),
-        salesAPI.getDailyScriptsDispensedForRange(selectedPharmacy, date, date),
-        salesAPI.getDailyDispensaryPercentForRange(selectedPharmacy, date, date),
-        salesAPI.getDailyDispensaryTurnoverForRange(selectedPharmacy, date, date)
+      const [metricsData, previousYearTurnoverData] = await Promise.all([
+        metricsAPI.getMetricsForRange(selectedPharmacy, date, date, [
+          'turnover',
+          'gp',
+          'transactions',
+          'avg_basket',
+          'daily_avg_basket',
+          'daily_cash_sales',
+          'daily_account_sales',
+          'daily_cod_sales',
+          'daily_cash_tenders',
+          'daily_credit_card_tenders',
+          'daily_scripts_dispensed',
+          'daily_dispensary_percent',
+          'daily_dispensary_turnover',
+          'costs'
+        ]),
+        turnoverAPI.getTurnoverForRange(selectedPharmacy, previousYearDateStr, previousYearDateStr)
       ])
+      const {
+        turnover: turnoverData,
+        gp: gpData,
+        transactions: transactionsData,
+        avg_basket: avgBasketData,
+        daily_avg_basket: avgBasketSizeData,
+        daily_cash_sales: cashSalesData,
+        daily_account_sales: accountSalesData,
+        daily_cod_sales: codSalesData,
+        daily_cash_tenders: cashTendersData,
+        daily_credit_card_tenders: creditCardTendersData,
+        daily_scripts_dispensed: scriptsDispensedData,
+        daily_dispensary_percent: dispensaryPercentData,
+        daily_dispensary_turnover: dispensaryTurnoverData,
+        costs: costsData
+      } = metricsData.metrics
 
       const turnover = turnoverData.turnover || 0
       const transactions = transactionsData.total_transactions || 0
@@ -368,8 +372,7 @@ const Daily = ({ selectedDate }) => {
       const percent = dispensaryPercentData.daily_dispensary_percent?.[0]?.dispensary_percent || 0;
       setDispensaryPercent(percent);
 
-      // Fetch cost of sales and purchases
-      const costsData = await financialAPI.getCostsForRange(selectedPharmacy, date, date);
+      // Cost of sales and purchases
       const costOfSales = costsData.cost_of_sales || 0;
       const purchases = costsData.purchases || 0;
 
@@ -471,8 +471,7 @@ const Stock = ({ selectedDate }) => {
       // Fetch all stock-related data in parallel
       const [
         closingStockData,
-        turnoverRatioData,
-        daysOfInventoryData,
+        inventoryKpisData,
         stockAdjustmentsData,
         costsData,
         // Monthly purchases and cost of sales
@@ -482,8 +481,7 @@ const Stock = ({ selectedDate }) => {
         last30CostOfSalesData // Added for last 30 days
       ] = await Promise.all([
         stockAPI.getClosingStockForRange(selectedPharmacy, date, date).catch(() => ({ closing_stock: 0 })),
-        stockAPI.getTurnoverRatioForRange(selectedPharmacy, date, date).catch(() => ({ turnover_ratio: 0 })),
-        stockAPI.getDaysOfInventoryForRange(selectedPharmacy, date, date).catch(() => ({ days_of_inventory: 0 })),
+        stockAPI.getInventoryKpisForRange(selectedPharmacy, date, date).catch(() => ({ turnover_ratio: 0, days_of_inventory: 0 })),
         stockAPI.getStockAdjustmentsForRange(selectedPharmacy, date, date).catch(() => ({ stock_adjustments: 0 })),
         financialAPI.getCostsForRange(selectedPharmacy, date, date).catch(() => ({ cost_of_sales: 0, purchases: 0 })),
         // Monthly purchases and cost of sales
@@ -492,6 +490,8 @@ const Stock = ({ selectedDate }) => {
         stockAPI.getOpeningStockForRange(selectedPharmacy, date, date).catch(() => ({ opening_stock: 0 })), // Added openingStockData
         financialAPI.getDailyCostOfSalesForRange(selectedPharmacy, last30StartDate, last30EndDate).catch(() => ({ daily_cost_of_sales: [] })) // Added for last 30 days
       ]);
+      const turnoverRatioData = inventoryKpisData;
+      const daysOfInventoryData = inventoryKpisData;
 
       // Calculate avg daily cost of sales for last 30 days
       let avgDailyCostOfSales = 0;
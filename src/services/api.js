@@ -40,6 +40,22 @@ api.interceptors.response.use(
   }
 )
 
+// Daily series are requested in columnar form ({ dates: [...], values: [...] }),
+// which is much smaller on the wire for long ranges, and expanded back into
+// the { <series>: [{ date, <value_key>: value }] } shape the pages use.
+const expandSeries = ({ series, value_key, dates, values, ...rest }) => ({
+  ...rest,
+  [series]: dates.map((date, i) => ({ date, [value_key]: values[i] }))
+})
+
+const getDailySeries = async (name, pharmacy, startDate, endDate) => {
+  const response = await api.get(`/${name}_for_range/${startDate}/${endDate}`, {
+    headers: { 'X-Pharmacy': pharmacy },
+    params: { format: 'columnar' }
+  })
+  return expandSeries(response.data)
+}
+
 // Authentication API
 export const authAPI = {
   login: async (username, password) => {
@@ -70,10 +86,7 @@ export const turnoverAPI = {
   },
 
   getDailyTurnoverForRange: async (pharmacy, startDate, endDate) => {
-    const response = await api.get(`/daily_turnover_for_range/${startDate}/${endDate}`, {
-      headers: { 'X-Pharmacy': pharmacy }
-    })
-    return response.data
+    return getDailySeries('daily_turnover', pharmacy, startDate, endDate)
   },
 
   getLatestDateWithData: async (pharmacy) => {
@@ -92,10 +105,7 @@ export const financialAPI = {
   },
 
   getDailyGPPercentForRange: async (pharmacy, startDate, endDate) => {
-    const response = await api.get(`/daily_gp_percent_for_range/${startDate}/${endDate}`, {
-      headers: { 'X-Pharmacy': pharmacy }
-    })
-    return response.data
+    return getDailySeries('daily_gp_percent', pharmacy, startDate, endDate)
   },
 
   getCostsForRange: async (pharmacy, startDate, endDate) => {
@@ -120,24 +130,15 @@ export const financialAPI = {
   },
 
   getDailyAvgBasketForRange: async (pharmacy, startDate, endDate) => {
-    const response = await api.get(`/daily_avg_basket_for_range/${startDate}/${endDate}`, {
-      headers: { 'X-Pharmacy': pharmacy }
-    })
-    return response.data
+    return getDailySeries('daily_avg_basket', pharmacy, startDate, endDate)
   },
 
   getDailyPurchasesForRange: async (pharmacy, startDate, endDate) => {
-    const response = await api.get(`/daily_purchases_for_range/${startDate}/${endDate}`, {
-      headers: { 'X-Pharmacy': pharmacy }
-    })
-    return response.data
+    return getDailySeries('daily_purchases', pharmacy, startDate, endDate)
   },
 
   getDailyCostOfSalesForRange: async (pharmacy, startDate, endDate) => {
-    const response = await api.get(`/daily_cost_of_sales_for_range/${startDate}/${endDate}`, {
-      headers: { 'X-Pharmacy': pharmacy }
-    })
-    return response.data
+    return getDailySeries('daily_cost_of_sales', pharmacy, startDate, endDate)
   }
 }
 
@@ -176,64 +177,75 @@ export const stockAPI = {
       headers: { 'X-Pharmacy': pharmacy }
     })
     return response.data
+  },
+
+  // Turnover ratio and days of inventory fields in one response
+  getInventoryKpisForRange: async (pharmacy, startDate, endDate) => {
+    const response = await api.get(`/inventory_kpis_for_range/${startDate}/${endDate}`, {
+      headers: { 'X-Pharmacy': pharmacy }
+    })
+    return response.data
   }
 }
 
 // Sales API
 export const salesAPI = {
   getDailyCashSalesForRange: async (pharmacy, startDate, endDate) => {
-    const response = await api.get(`/daily_cash_sales_for_range/${startDate}/${endDate}`, {
-      headers: { 'X-Pharmacy': pharmacy }
-    })
-    return response.data
+    return getDailySeries('daily_cash_sales', pharmacy, startDate, endDate)
   },
 
   getDailyAccountSalesForRange: async (pharmacy, startDate, endDate) => {
-    const response = await api.get(`/daily_account_sales_for_range/${startDate}/${endDate}`, {
-      headers: { 'X-Pharmacy': pharmacy }
-    })
-    return response.data
+    return getDailySeries('daily_account_sales', pharmacy, startDate, endDate)
   },
 
   getDailyCODSalesForRange: async (pharmacy, startDate, endDate) => {
-    const response = await api.get(`/daily_cod_sales_for_range/${startDate}/${endDate}`, {
-      headers: { 'X-Pharmacy': pharmacy }
-    })
-    return response.data
+    return getDailySeries('daily_cod_sales', pharmacy, startDate, endDate)
   },
 
   getDailyScriptsDispensedForRange: async (pharmacy, startDate, endDate) => {
-    const response = await api.get(`/daily_scripts_dispensed_for_range/${startDate}/${endDate}`, {
-      headers: { 'X-Pharmacy': pharmacy }
-    })
-    return response.data
+    return getDailySeries('daily_scripts_dispensed', pharmacy, startDate, endDate)
   },
 
   getDailyCashTendersForRange: async (pharmacy, startDate, endDate) => {
-    const response = await api.get(`/daily_cash_tenders_for_range/${startDate}/${endDate}`, {
-      headers: { 'X-Pharmacy': pharmacy }
-    })
-    return response.data
+    return getDailySeries('daily_cash_tenders', pharmacy, startDate, endDate)
   },
 
   getDailyCreditCardTendersForRange: async (pharmacy, startDate, endDate) => {
-    const response = await api.get(`/daily_credit_card_tenders_for_range/${startDate}/${endDate}`, {
-      headers: { 'X-Pharmacy': pharmacy }
-    })
-    return response.data
+    return getDailySeries('daily_credit_card_tenders', pharmacy, startDate, endDate)
   },
 
   getDailyDispensaryPercentForRange: async (pharmacy, startDate, endDate) => {
-    const response = await api.get(`/daily_dispensary_percent_for_range/${startDate}/${endDate}`, {
-      headers: { 'X-Pharmacy': pharmacy }
-    })
-    return response.data
+    return getDailySeries('daily_dispensary_percent', pharmacy, startDate, endDate)
   },
 
   getDailyDispensaryTurnoverForRange: async (pharmacy, startDate, endDate) => {
-    const response = await api.get(`/daily_dispensary_turnover_for_range/${startDate}/${endDate}`, {
-      headers: { 'X-Pharmacy': pharmacy }
-    })
+    return getDailySeries('daily_dispensary_turnover', pharmacy, startDate, endDate)
+  }
+}
+
+// Batched metrics API
+export const metricsAPI = {
+  // Returns { metrics: { <field>: <same payload as /<field>_for_range> } }
+  getMetricsForRange: async (pharmacy, startDate, endDate, fields) => {
+    const params = { format: 'columnar' }
+    if (fields) params.fields = fields.join(',')
+    const response = await api.get(`/metrics_for_range/${startDate}/${endDate}`, {
+      headers: { 'X-Pharmacy': pharmacy },
+      params
+    })
+    const metrics = {}
+    for (const [field, payload] of Object.entries(response.data.metrics)) {
+      metrics[field] = payload && payload.dates ? expandSeries(payload) : payload
+    }
+    return { ...response.data, metrics }
+  },
+
+  // Returns { pharmacies: [...], metrics: { <pharmacy>: { <field>: <payload> } } }
+  comparePharmacies: async (startDate, endDate, pharmacies, fields) => {
+    const params = {}
+    if (pharmacies) params.pharmacies = pharmacies.join(',')
+    if (fields) params.fields = fields.join(',')
+    const response = await api.get(`/compare_pharmacies/${startDate}/${endDate}`, { params })
     return response.data
   }
 }
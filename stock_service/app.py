@@ -3,6 +3,9 @@ from flask_cors import CORS
 from config import Config
 from models import db
 from database import init_database
+from instrumentation import init_instrumentation
+from json_provider import FastJSONProvider
+from compression import init_compression
 from datetime import datetime
 import os
 
@@ -13,6 +16,7 @@ from routes.smart_alerts_routes import smart_alerts_bp
 
 def create_app():
     app = Flask(__name__)
+    app.json = FastJSONProvider(app)
     app.config.from_object(Config)
     
     # Initialize database
@@ -34,6 +38,24 @@ def create_app():
     app.register_blueprint(import_bp, url_prefix='/api/import')
     app.register_blueprint(smart_alerts_bp, url_prefix='/api/stock/smart-alerts')
     
+    # Per-endpoint latency and SQL statement metrics (Prometheus text format)
+    if app.config['METRICS_ENABLED']:
+        init_instrumentation(
+            app,
+            'tlc_stock',
+            window=app.config['METRICS_WINDOW'],
+            token=app.config['METRICS_TOKEN']
+        )
+    
+    # Compress large JSON responses such as the stock level listings
+    if app.config['COMPRESSION_ENABLED']:
+        init_compression(
+            app,
+            min_size=app.config['COMPRESSION_MIN_SIZE'],
+            gzip_level=app.config['COMPRESSION_GZIP_LEVEL'],
+            brotli_level=app.config['COMPRESSION_BROTLI_LEVEL']
+        )
+    
     # Admin interface route
     @app.route('/admin')
     def admin_interface():
@@ -68,7 +90,8 @@ def create_app():
                 'stock': '/api/stock',
                 'import': '/api/import', 
                 'smart_alerts': '/api/stock/smart-alerts',
-                'health': '/health'
+                'health': '/health',
+                'metrics': '/api/metrics'
             },
             'documentation': 'Available endpoints for stock management and analytics'
         })
@@ -0,0 +1,93 @@
+import zlib
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+# Response compression. JSON and other text responses of at least min_size
+# bytes are compressed with Brotli (when the brotli package is installed) or
+# gzip, whichever the client accepts. Streamed responses are compressed chunk
+# by chunk and flushed so each chunk still reaches the client as it is ready.
+# A copy of the dashboard's app/compression.py without its static file helpers.
+
+COMPRESSIBLE_MIMETYPES = frozenset([
+    'application/json', 'application/javascript', 'application/xml',
+    'image/svg+xml', 'text/css', 'text/csv', 'text/html',
+    'text/javascript', 'text/plain', 'text/xml',
+])
+
+def _gzip_compressor(level):
+    # wbits=31 writes a gzip header and trailer
+    return zlib.compressobj(level, zlib.DEFLATED, 31)
+
+def choose_encoding(accept_encodings):
+    if brotli is not None and accept_encodings.quality('br') > 0:
+        return 'br'
+    if accept_encodings.quality('gzip') > 0:
+        return 'gzip'
+    return None
+
+def compress_body(body, encoding, gzip_level=6, brotli_level=4):
+    if encoding == 'br':
+        return brotli.compress(body, quality=brotli_level)
+    compressor = _gzip_compressor(gzip_level)
+    return compressor.compress(body) + compressor.flush()
+
+def _compress_stream(chunks, encoding, gzip_level, brotli_level):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=brotli_level)
+        compress, flush, finish = compressor.process, compressor.flush, compressor.finish
+    else:
+        compressor = _gzip_compressor(gzip_level)
+        compress, flush, finish = compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            if chunk:
+                yield compress(chunk) + flush()
+        yield finish()
+    finally:
+        # Closing the original iterable ends stream_with_context's request context
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+def init_compression(app, min_size=1024, gzip_level=6, brotli_level=4, compressible=COMPRESSIBLE_MIMETYPES):
+    """Compress eligible responses of app according to the request's Accept-Encoding."""
+
+    @app.after_request
+    def compress_response(response):
+        if (response.status_code < 200 or response.status_code in (204, 206, 304)
+                or response.direct_passthrough
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in compressible):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = choose_encoding(request.accept_encodings)
+        # Streamed responses usually have no Content-Length and are always compressed
+        if encoding is None or (response.content_length is not None and response.content_length < min_size):
+            return response
+
+        if response.is_streamed:
+            response.response = _compress_stream(response.response, encoding, gzip_level, brotli_level)
+            response.headers.pop('Content-Length', None)
+        else:
+            body = response.get_data()
+            compressed = compress_body(body, encoding, gzip_level, brotli_level)
+            if len(compressed) >= len(body):
+                return response
+            response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+
+        # The compressed bytes differ from the identity representation, so a
+        # strong ETag must not be reused for them; If-None-Match still matches
+        # the weak form.
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+    return compress_response
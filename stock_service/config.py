@@ -52,6 +52,17 @@ class Config:
     # API Configuration
     MAIN_API_URL = os.getenv('MAIN_API_URL', 'https://tlcwebdashboard2.onrender.com/api')
     
+    # Request instrumentation exported on /api/metrics
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+    METRICS_WINDOW = int(os.getenv('METRICS_WINDOW', '1024'))  # Recent samples kept per endpoint
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')  # Bearer token for scrapers; /api/metrics is off without it
+    
+    # Response compression (Brotli if installed, else gzip) for responses of at least COMPRESSION_MIN_SIZE bytes
+    COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'true').lower() == 'true'
+    COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '1024'))
+    COMPRESSION_GZIP_LEVEL = int(os.getenv('COMPRESSION_GZIP_LEVEL', '6'))
+    COMPRESSION_BROTLI_LEVEL = int(os.getenv('COMPRESSION_BROTLI_LEVEL', '4'))
+    
     # Stock Analysis Configuration
     LOW_STOCK_THRESHOLD_DAYS = int(os.getenv('LOW_STOCK_THRESHOLD_DAYS', '7'))  # Days of inventory
     OVERSTOCK_THRESHOLD_MONTHS = int(os.getenv('OVERSTOCK_THRESHOLD_MONTHS', '6'))  # Months of inventory
@@ -0,0 +1,148 @@
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from flask import Response, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Per-endpoint request instrumentation: wall time, SQL statements, rows
+# returned and RSS delta. Samples are kept in a bounded window per endpoint
+# and exported as Prometheus summaries (p50/p95/p99) on /api/metrics.
+#
+# Measurement starts in before_request and ends when the response is closed,
+# so streamed responses are timed until their last chunk has been sent.
+# Copy of app/instrumentation.py; this service is deployed on its own and
+# cannot import the dashboard's app package.
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# name -> (help text, sample index)
+SUMMARIES = {
+    'request_duration_seconds': ('Request wall time including streaming the body', 0),
+    'request_sql_statements': ('SQL statements executed while serving the request', 1),
+    'request_sql_rows': ('Rows reported by the database driver (PostgreSQL counts SELECT rows, SQLite only DML)', 2),
+    'request_rss_delta_bytes': ('Change in process RSS across the request', 3),
+}
+
+_current = threading.local()
+
+def _rss_bytes():
+    # /proc is cheaper than psutil here and exists on the Render hosts
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    counters = getattr(_current, 'counters', None)
+    if counters is not None:
+        counters[0] += 1
+        if cursor.rowcount and cursor.rowcount > 0:
+            counters[1] += cursor.rowcount
+
+class RequestMetrics:
+    """Bounded per-endpoint samples plus cumulative counts and sums."""
+
+    def __init__(self, namespace, window):
+        self.namespace = namespace
+        self.window = window
+        self._samples = defaultdict(lambda: deque(maxlen=self.window))
+        self._sums = defaultdict(lambda: [0.0] * len(SUMMARIES))
+        self._counts = defaultdict(int)
+        self._statuses = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, status, sample):
+        with self._lock:
+            self._samples[endpoint].append(sample)
+            sums = self._sums[endpoint]
+            for i, value in enumerate(sample):
+                sums[i] += value
+            self._counts[endpoint] += 1
+            self._statuses[(endpoint, status)] += 1
+
+    def render(self):
+        """Prometheus text exposition of every endpoint seen so far."""
+        with self._lock:
+            samples = {endpoint: list(values) for endpoint, values in self._samples.items()}
+            sums = {endpoint: list(values) for endpoint, values in self._sums.items()}
+            counts = dict(self._counts)
+            statuses = dict(self._statuses)
+
+        lines = []
+        for name, (help_text, index) in SUMMARIES.items():
+            metric = f'{self.namespace}_{name}'
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} summary')
+            for endpoint in sorted(samples):
+                values = sorted(sample[index] for sample in samples[endpoint])
+                label = _label(endpoint)
+                for q in QUANTILES:
+                    lines.append(f'{metric}{{endpoint="{label}",quantile="{q}"}} {_quantile(values, q)}')
+                lines.append(f'{metric}_sum{{endpoint="{label}"}} {sums[endpoint][index]}')
+                lines.append(f'{metric}_count{{endpoint="{label}"}} {counts[endpoint]}')
+
+        metric = f'{self.namespace}_requests_total'
+        lines.append(f'# HELP {metric} Requests served by endpoint and status code')
+        lines.append(f'# TYPE {metric} counter')
+        for (endpoint, status), value in sorted(statuses.items()):
+            lines.append(f'{metric}{{endpoint="{_label(endpoint)}",status="{status}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+def _quantile(values, q):
+    if not values:
+        return 'NaN'
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def init_instrumentation(app, namespace, window=1024, token=None, path='/api/metrics'):
+    """Instrument every request of a Flask app and serve the results on path.
+
+    The metrics endpoint requires 'Authorization: Bearer <token>'; without a
+    token nothing is instrumented or exposed and None is returned, so traffic
+    and latency figures are never public.
+    """
+    if not token:
+        print(f"[Metrics] No METRICS_TOKEN set, {path} disabled", flush=True)
+        return None
+    metrics = RequestMetrics(namespace, window)
+    if not event.contains(Engine, 'after_cursor_execute', _count_statement):
+        event.listen(Engine, 'after_cursor_execute', _count_statement)
+
+    @app.before_request
+    def start_request_metrics():
+        _current.counters = [0, 0]
+        _current.started = time.perf_counter()
+        _current.rss = _rss_bytes()
+
+    @app.after_request
+    def finish_request_metrics(response):
+        counters = getattr(_current, 'counters', None)
+        if counters is None:
+            return response
+        endpoint = request.endpoint or 'unmatched'
+        started, rss = _current.started, _current.rss
+
+        def record():
+            metrics.record(endpoint, response.status_code, (
+                time.perf_counter() - started,
+                counters[0],
+                counters[1],
+                _rss_bytes() - rss
+            ))
+            _current.counters = None
+
+        response.call_on_close(record)
+        return response
+
+    def metrics_endpoint():
+        if request.headers.get('Authorization') != f'Bearer {token}':
+            return Response('Unauthorized\n', status=401, mimetype='text/plain')
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+    app.add_url_rule(path, 'request_metrics', metrics_endpoint, methods=['GET'])
+    return metrics
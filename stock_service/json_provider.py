@@ -0,0 +1,56 @@
+import json
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional: fall back to the standard library encoder
+    orjson = None
+
+# Fast JSON for API responses (a copy of the dashboard's app/json_provider.py).
+# With orjson installed, jsonify() encodes through it; otherwise Flask's
+# default provider is used unchanged. Output matches the default provider: sorted keys, dates via
+# Flask's default() hook, and compact unless pretty-printing in debug mode.
+
+def dumps_bytes(obj, sort_keys=False, indent=False, default=None):
+    """Encode obj to UTF-8 JSON bytes, with orjson when available."""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, default=default, option=option)
+        except (TypeError, orjson.JSONEncodeError):
+            # e.g. integers beyond 64 bits; let the stdlib encoder handle it
+            pass
+    return json.dumps(obj, sort_keys=sort_keys, indent=2 if indent else None, default=default).encode('utf-8')
+
+def dumps(obj):
+    """Encode obj to a JSON str (used for chunks of streamed responses)."""
+    return dumps_bytes(obj).decode('utf-8')
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes with orjson when it is installed."""
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs.keys() - {'sort_keys', 'default'}:
+            return super().dumps(obj, **kwargs)
+        return dumps_bytes(
+            obj,
+            sort_keys=kwargs.get('sort_keys', self.sort_keys),
+            default=kwargs.get('default', self.default)
+        ).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        body = dumps_bytes(obj, sort_keys=self.sort_keys, indent=indent, default=self.default)
+        return self._app.response_class(body + b"\n", mimetype=self.mimetype)
@@ -0,0 +1,53 @@
+import os
+import sys
+import tempfile
+import threading
+import pytest
+
+# config.settings and app.db read the environment when first imported, so the
+# test database has to be chosen before anything from app is imported
+_db_dir = tempfile.mkdtemp(prefix='tlc-tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_db_dir, 'daily_reports.db')}"
+os.environ.pop('DATABASE_READ_URL', None)
+os.environ['INGEST_ENABLED'] = 'false'
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+sys.path.insert(0, os.path.join(project_root, 'scripts'))
+
+import imap_standin
+from app.db import create_session
+from app.models import DailyReport, DataVersion, MailboxWatermark, MonthlyRollup
+
+@pytest.fixture
+def imap_server(tmp_path):
+    """The IMAP stand-in serving tmp_path on a free local port."""
+    server = imap_standin.IMAPStandIn(('127.0.0.1', 0), imap_standin.Mailstore(str(tmp_path), 1))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def mailbox(imap_server):
+    """A pharmacy config whose mailbox lives on the stand-in."""
+    return {
+        "code": "reitz",
+        "name": "Reitz Pharmacy",
+        "email_user": "reitz@example.com",
+        "email_password": "secret",
+        "imap_server": "127.0.0.1",
+        "imap_port": imap_server.server_address[1],
+        "imap_ssl": False
+    }
+
+@pytest.fixture
+def session():
+    """A session on the test database, emptied of reports and ingestion state first."""
+    session = create_session()
+    for model in (DailyReport, MonthlyRollup, DataVersion, MailboxWatermark):
+        session.query(model).delete()
+    session.commit()
+    yield session
+    session.close()
@@ -0,0 +1,106 @@
+import datetime
+import os
+import socket
+import threading
+import time
+import imap_standin
+from app.email_fetcher import _get_imap_connection
+from app.imap_idle import MailboxWatcher, idle_wait
+from app.ingestion import _ingest_pushed
+from app.models import DailyReport
+
+# IMAP IDLE against the stand-in: idle_wait notices new mail, a MailboxWatcher
+# ingests it over its open connection, and reconnects back off exponentially.
+
+def _add_report(imap_server, mailbox, report_date):
+    path = os.path.join(imap_server.store.root, mailbox["email_user"], f"{report_date.strftime('%Y%m%d')}.eml")
+    with open(path, 'wb') as f:
+        f.write(imap_standin.report_message(mailbox["email_user"], report_date))
+
+def _wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.1)
+    return False
+
+def _has_report(session, report_date):
+    session.expire_all()
+    return session.query(DailyReport).filter_by(pharmacy_code="reitz", report_date=report_date).count() == 1
+
+def test_idle_wait_returns_when_mail_arrives(imap_server, mailbox):
+    imap_standin.seed(imap_server.store.root, mailbox["email_user"], days=1)
+    mail = _get_imap_connection(mailbox)
+    try:
+        mail.select("inbox")
+        threading.Timer(0.5, _add_report, (imap_server, mailbox, datetime.date.today())).start()
+        started = time.monotonic()
+        assert idle_wait(mail, 10) is True
+        assert time.monotonic() - started < 5
+        # The connection takes normal commands again
+        status, data = mail.uid('search', None, 'ALL')
+        assert status == "OK"
+        assert data[0].split() == [b'1', b'2']
+    finally:
+        mail.logout()
+
+def test_idle_wait_times_out_without_mail(imap_server, mailbox):
+    imap_standin.seed(imap_server.store.root, mailbox["email_user"], days=1)
+    mail = _get_imap_connection(mailbox)
+    try:
+        mail.select("inbox")
+        assert idle_wait(mail, 1) is False
+        assert mail.noop()[0] == "OK"
+    finally:
+        mail.logout()
+
+def test_watcher_stores_mail_pushed_during_idle(imap_server, mailbox, session):
+    yesterday = datetime.date.today() - datetime.timedelta(days=1)
+    imap_standin.seed(imap_server.store.root, mailbox["email_user"], days=1)
+    watcher = MailboxWatcher(mailbox, _ingest_pushed, idle_timeout=2, max_backoff=1).start()
+    try:
+        # Catches up on connect, then waits in IDLE
+        assert _wait_for(lambda: _has_report(session, yesterday))
+        assert watcher.connected
+
+        today = datetime.date.today()
+        _add_report(imap_server, mailbox, today)
+        assert _wait_for(lambda: _has_report(session, today))
+        status = watcher.status()
+        assert status["supported"] is True
+        assert status["connects"] == 1
+        assert status["notifications"] >= 1
+    finally:
+        watcher.stop()
+
+class _RecordingStop(threading.Event):
+    """Records the watcher's reconnect waits instead of sleeping; sets itself after `limit` of them."""
+
+    def __init__(self, limit):
+        super().__init__()
+        self.limit = limit
+        self.waits = []
+
+    def wait(self, timeout=None):
+        self.waits.append(timeout)
+        if len(self.waits) >= self.limit:
+            self.set()
+        return self.is_set()
+
+def test_watcher_backs_off_exponentially_while_unreachable(mailbox):
+    # A port nothing listens on
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        closed_port = probe.getsockname()[1]
+    unreachable = dict(mailbox, imap_port=closed_port)
+    watcher = MailboxWatcher(unreachable, _ingest_pushed, idle_timeout=2, max_backoff=8)
+    watcher._stop = _RecordingStop(limit=6)
+
+    watcher._loop()
+
+    assert watcher._stop.waits == [1, 2, 4, 8, 8, 8]
+    status = watcher.status()
+    assert status["connected"] is False
+    assert status["connects"] == 0
+    assert "Failed to connect" in status["last_error"]
@@ -0,0 +1,63 @@
+import datetime
+import os
+import imap_standin
+from app.ingestion import load_watermark, run_ingestion
+from app.models import DailyReport
+
+# Incremental ingestion against the IMAP stand-in: the UID watermark limits
+# later cycles to new messages and is reset when UIDVALIDITY changes.
+
+def _add_report(imap_server, mailbox, report_date):
+    path = os.path.join(imap_server.store.root, mailbox["email_user"], f"{report_date.strftime('%Y%m%d')}.eml")
+    with open(path, 'wb') as f:
+        f.write(imap_standin.report_message(mailbox["email_user"], report_date))
+
+def _watermark(session):
+    # Ingestion writes through its own sessions
+    session.expire_all()
+    return load_watermark(session, "reitz")
+
+def _report_dates(session):
+    return sorted(row.report_date for row in session.query(DailyReport.report_date))
+
+def test_first_run_stores_reports_and_sets_watermark(imap_server, mailbox, session):
+    imap_standin.seed(imap_server.store.root, mailbox["email_user"], days=3)
+
+    summary = run_ingestion([mailbox], workers=1, days=7)
+
+    today = datetime.date.today()
+    assert summary["messages"] == 3
+    assert summary["reports"] == 3
+    assert summary["errors"] == 0
+    assert _report_dates(session) == [today - datetime.timedelta(days=n) for n in (3, 2, 1)]
+    assert _watermark(session) == {'uidvalidity': 1, 'last_uid': 3}
+
+def test_incremental_rerun_fetches_only_new_messages(imap_server, mailbox, session):
+    imap_standin.seed(imap_server.store.root, mailbox["email_user"], days=3)
+    run_ingestion([mailbox], workers=1, days=7)
+
+    summary = run_ingestion([mailbox], workers=1, days=7)
+    assert summary["messages"] == 0
+    assert summary["reports"] == 0
+    assert _watermark(session) == {'uidvalidity': 1, 'last_uid': 3}
+
+    today = datetime.date.today()
+    _add_report(imap_server, mailbox, today)
+    summary = run_ingestion([mailbox], workers=1, days=7)
+    assert summary["messages"] == 1
+    assert summary["mailboxes"][0]["dates"] == [today.isoformat()]
+    assert _watermark(session) == {'uidvalidity': 1, 'last_uid': 4}
+    assert len(_report_dates(session)) == 4
+
+def test_uidvalidity_change_resets_watermark(imap_server, mailbox, session):
+    imap_standin.seed(imap_server.store.root, mailbox["email_user"], days=3)
+    run_ingestion([mailbox], workers=1, days=7)
+
+    # The server renumbered the mailbox: stored UIDs mean nothing any more
+    imap_server.store = imap_standin.Mailstore(imap_server.store.root, 2)
+    summary = run_ingestion([mailbox], workers=1, days=7)
+
+    assert summary["messages"] == 3
+    assert summary["errors"] == 0
+    assert _watermark(session) == {'uidvalidity': 2, 'last_uid': 3}
+    assert len(_report_dates(session)) == 3